@@ -0,0 +1,203 @@
+import asyncio
+import gzip
+import json
+import os
+
+
+PAGE_SIZE = 100
+PARQUET_COLUMNS = ["id", "timestamp", "edited_timestamp", "author_id", "author_name", "content", "embeds", "attachments"]
+
+
+class ChannelExporter:
+    def __init__(self, discord_int, path, compression="gzip", level=6, parquet_dir=None, pages_per_checkpoint=10, prefetch=4, retries=5):
+        """
+        Initializes the ChannelExporter object.
+
+        Streams a channel's history into a JSON lines file, one message per
+        line, oldest first. A fetch task pages through the history with
+        get_messages while each batch is compressed and written in a worker
+        thread, so the event loop keeps fetching meanwhile and at most
+        prefetch pages are held in memory.
+
+        Every pages_per_checkpoint pages the compressed frame is closed, the
+        file synced and the last exported message ID and file size recorded
+        in path + ".checkpoint". A later export resumes from there, cutting
+        off anything written after the checkpoint first, so an interrupted
+        export never leaves duplicate or broken lines behind.
+
+        Parameters:
+            - discord_int: The DiscordIntegration used to read the channel.
+            - path: The path of the JSON lines file.
+            - compression: "gzip", "zstd" (requires zstandard) or None.
+            - level: The compression level.
+            - parquet_dir: A directory to also write Parquet parts to, one per checkpoint (requires pyarrow).
+            - pages_per_checkpoint: Number of pages of 100 messages between checkpoints.
+            - prefetch: Number of fetched pages that may wait for the writer.
+            - retries: Number of times a page is retried after a 429 or 5xx response.
+        """
+        if compression not in ("gzip", "zstd", None):
+            raise ValueError(f"Unknown compression: {compression}")
+
+        self.discord_int = discord_int
+        self.path = path
+        self.compression = compression
+        self.level = level
+        self.parquet_dir = parquet_dir
+        self.pages_per_checkpoint = pages_per_checkpoint
+        self.prefetch = prefetch
+        self.retries = retries
+        self.checkpoint_path = path + ".checkpoint"
+        self.error = None
+        self.zstd = None
+        self.pyarrow = None
+
+        if compression == "zstd":
+            try:
+                import zstandard
+            except ImportError:
+                raise ImportError("zstd compression requires zstandard: pip install zstandard")
+            self.zstd = zstandard.ZstdCompressor(level=level)
+        if parquet_dir is not None:
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise ImportError("Parquet export requires pyarrow: pip install pyarrow")
+            self.pyarrow = pyarrow
+            os.makedirs(parquet_dir, exist_ok=True)
+
+    def checkpoint(self):
+        """
+        Returns the last checkpoint.
+
+        Returns:
+            - checkpoint: A dictionary with last_id, offset and exported.
+            - None: If nothing was exported yet.
+        """
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path) as f:
+            return json.load(f)
+
+    async def export(self, channel_id=None, after="0"):
+        """
+        Exports the channel history, resuming from the last checkpoint.
+
+        Parameters:
+            - channel_id: The channel to export instead of the configured one.
+            - after: The message ID to start after when there is no checkpoint.
+
+        Returns:
+            - exported: The number of messages exported by this call. If a page
+              could not be fetched, the export stops there and error holds the
+              status code of the failed request.
+
+        Raises:
+            - Exception: Whatever get_messages raised, after the pages fetched before it are written.
+        """
+        self.error = None
+        checkpoint = self.checkpoint() or {"last_id": after, "offset": 0, "exported": 0}
+        pages = asyncio.Queue(maxsize=self.prefetch)
+        fetcher = asyncio.ensure_future(self._fetch(channel_id, checkpoint["last_id"], pages))
+        try:
+            return await self._write(pages, checkpoint)
+        finally:
+            fetcher.cancel()
+            await asyncio.gather(fetcher, return_exceptions=True)
+
+    async def _fetch(self, channel_id, after, pages):
+        attempts = 0
+        while True:
+            try:
+                page = await self.discord_int.get_messages(after=after, limit=PAGE_SIZE, channel_id=channel_id)
+            except Exception as e:
+                # Handed to the writer, which raises it from export.
+                await pages.put(e)
+                return
+            if page is None or (isinstance(page, int) and (page == 429 or page >= 500)):
+                # The 429 already updated the channel's bucket, so the retry waits out Retry-After.
+                attempts += 1
+                if attempts <= self.retries:
+                    await asyncio.sleep(min(2 ** attempts / 10, 5))
+                    continue
+            attempts = 0
+            await pages.put(page)
+            # A failure or a short page is the last item the writer gets.
+            if not isinstance(page, list) or len(page) < PAGE_SIZE:
+                return
+            after = page[-1]["id"]
+
+    async def _write(self, pages, checkpoint):
+        loop = asyncio.get_running_loop()
+        exported = 0
+        batch = []
+        done = False
+        with open(self.path, "ab") as f:
+            f.truncate(checkpoint["offset"])
+            f.seek(checkpoint["offset"])
+            while not done:
+                page = await pages.get()
+                if isinstance(page, list):
+                    batch.append(page)
+                    done = len(page) < PAGE_SIZE
+                else:
+                    self.error = page
+                    done = True
+                    if not isinstance(page, Exception):
+                        print(f"Failed to fetch channel history: {page}")
+                if batch and (done or len(batch) >= self.pages_per_checkpoint):
+                    exported += await loop.run_in_executor(None, self._write_batch, f, batch, checkpoint)
+                    batch = []
+        if isinstance(self.error, Exception):
+            raise self.error
+        return exported
+
+    def _write_batch(self, f, batch, checkpoint):
+        messages = [message for page in batch for message in page]
+        if not messages:
+            return 0
+
+        frame = self._open_frame(f)
+        for message in messages:
+            frame.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+        if frame is not f:
+            frame.close()
+        f.flush()
+        os.fsync(f.fileno())
+        if self.parquet_dir is not None:
+            self._write_parquet(messages)
+
+        checkpoint["last_id"] = messages[-1]["id"]
+        checkpoint["offset"] = f.tell()
+        checkpoint["exported"] += len(messages)
+        temp_path = self.checkpoint_path + ".tmp"
+        with open(temp_path, "w") as c:
+            json.dump(checkpoint, c)
+        os.replace(temp_path, self.checkpoint_path)
+        return len(messages)
+
+    def _open_frame(self, f):
+        # Each batch is a complete gzip member or zstd frame; concatenated they still decompress as one stream.
+        if self.compression == "gzip":
+            return gzip.GzipFile(fileobj=f, mode="wb", compresslevel=self.level)
+        if self.compression == "zstd":
+            return self.zstd.stream_writer(f, closefd=False)
+        return f
+
+    def _write_parquet(self, messages):
+        columns = {name: [] for name in PARQUET_COLUMNS}
+        for message in messages:
+            author = message.get("author") or {}
+            columns["id"].append(message["id"])
+            columns["timestamp"].append(message.get("timestamp"))
+            columns["edited_timestamp"].append(message.get("edited_timestamp"))
+            columns["author_id"].append(author.get("id"))
+            columns["author_name"].append(author.get("username"))
+            columns["content"].append(message.get("content"))
+            columns["embeds"].append(json.dumps(message.get("embeds", [])))
+            columns["attachments"].append(json.dumps(message.get("attachments", [])))
+
+        part_path = os.path.join(self.parquet_dir, f"part-{messages[0]['id']}.parquet")
+        temp_path = part_path + ".tmp"
+        self.pyarrow.parquet.write_table(self.pyarrow.table(columns), temp_path, compression=self.compression or "none")
+        os.replace(temp_path, part_path)
@@ -0,0 +1,336 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+if __package__:
+    from .DiscordIntegration import DiscordIntegration
+else:
+    from DiscordIntegration import DiscordIntegration
+
+
+MAX_MESSAGE_LENGTH = 2000
+
+
+class UdpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, daemon):
+        self.daemon = daemon
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        for line in data.splitlines():
+            reply = self.daemon.handle_line(line)
+            if reply is not None:
+                self.transport.sendto(json.dumps(reply).encode() + b"\n", addr)
+
+
+class DiscordDaemon:
+    def __init__(self, discord_int, routes, default_route=None, batch_interval=0.5, max_queue=10000):
+        """
+        Initializes the DiscordDaemon object.
+
+        The daemon accepts line-delimited JSON over a Unix socket, UDP or stdin
+        and forwards it through a single DiscordIntegration, so every process on
+        a host shares one connection pool and one rate limit.
+
+        A message line looks like {"route": "alerts", "content": "...", "priority": "critical"}.
+        Route and priority are optional. A command line looks like {"command": "stats"}
+        or {"command": "health"} and is answered with one JSON line.
+
+        Parameters:
+            - discord_int: The DiscordIntegration used to send messages.
+            - routes: A dictionary of route name to webhook URL.
+            - default_route: The route used when a message does not name one.
+            - batch_interval: Seconds to collect messages before sending them as one.
+            - max_queue: Number of queued messages per route and priority before new ones are dropped.
+        """
+        if not routes:
+            raise ValueError("At least one route is required")
+
+        self.discord_int = discord_int
+        self.routes = routes
+        self.default_route = default_route or next(iter(routes))
+        self.batch_interval = batch_interval
+        self.max_queue = max_queue
+        self.queues = {}
+        self.flushers = {}
+        self.servers = []
+        self.stopped = asyncio.Event()
+        self.started_at = time.time()
+        self.stats = {
+            "received": 0,
+            "invalid": 0,
+            "dropped": 0,
+            "batches": 0,
+            "sent": 0,
+            "failed": 0
+        }
+
+    def handle_line(self, line):
+        """
+        Handles one line of input.
+
+        Parameters:
+            - line: A JSON encoded message or command, as str or bytes.
+
+        Returns:
+            - reply: A dictionary to send back for commands and invalid commands.
+            - None: If the line was a message.
+        """
+        if not line.strip():
+            return None
+        try:
+            payload = json.loads(line)
+        except ValueError:
+            self.stats["invalid"] += 1
+            return None
+        if not isinstance(payload, dict):
+            self.stats["invalid"] += 1
+            return None
+
+        if "command" in payload:
+            if payload["command"] == "health":
+                return self.health()
+            if payload["command"] == "stats":
+                return self.get_stats()
+            return {"error": f"Unknown command: {payload['command']}"}
+
+        route = payload.get("route", self.default_route)
+        priority = payload.get("priority", "normal")
+        content = payload.get("content")
+        if not all(isinstance(value, str) for value in (route, priority, content)):
+            self.stats["invalid"] += 1
+            return None
+        if route not in self.routes or priority not in self.discord_int.scheduler.lanes or not content:
+            self.stats["invalid"] += 1
+            return None
+
+        self.stats["received"] += 1
+        queue = self._queue(route, priority)
+        for start in range(0, len(content), MAX_MESSAGE_LENGTH):
+            try:
+                queue.put_nowait(content[start:start + MAX_MESSAGE_LENGTH])
+            except asyncio.QueueFull:
+                self.stats["dropped"] += 1
+        return None
+
+    def health(self):
+        """
+        Returns the health of the daemon.
+
+        Returns:
+            - health: A dictionary with the status and uptime in seconds.
+        """
+        status = "stopping" if self.stopped.is_set() else "ok"
+        return {"status": status, "uptime": round(time.time() - self.started_at, 3)}
+
+    def get_stats(self):
+        """
+        Returns message counters and queue depths.
+
+        Returns:
+            - stats: A dictionary of counters, queued messages per route and
+              priority, and the scheduler backlog.
+        """
+        stats = dict(self.stats)
+        stats["queued"] = {f"{route}/{priority}": queue.qsize() for (route, priority), queue in self.queues.items()}
+        stats["scheduler_backlog"] = self.discord_int.scheduler.backlog()
+        stats["scheduler_dropped"] = self.discord_int.scheduler.dropped
+        stats["uptime"] = round(time.time() - self.started_at, 3)
+        return stats
+
+    async def serve(self, unix_socket=None, udp=None, stdin=False):
+        """
+        Serves the configured inputs until stop() is called or stdin is exhausted.
+
+        Parameters:
+            - unix_socket: The path of the Unix socket to listen on.
+            - udp: A (host, port) tuple to listen on for UDP datagrams.
+            - stdin: Whether to read lines from stdin.
+
+        Returns:
+            - None
+        """
+        loop = asyncio.get_running_loop()
+        reading = None
+        if unix_socket is not None:
+            if os.path.exists(unix_socket):
+                os.remove(unix_socket)
+            self.servers.append(await asyncio.start_unix_server(self._handle_stream, path=unix_socket))
+        if udp is not None:
+            transport, _ = await loop.create_datagram_endpoint(lambda: UdpProtocol(self), local_addr=udp)
+            self.servers.append(transport)
+        if stdin:
+            reader = asyncio.StreamReader()
+            try:
+                await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+                readline = reader.readline
+            except ValueError:
+                # The event loop only watches pipes, sockets and terminals, so a
+                # redirected file (< messages.jsonl) is read in a thread instead.
+                readline = lambda: loop.run_in_executor(None, sys.stdin.buffer.readline)
+            reading = loop.create_task(self._read_stdin(readline, stop_at_eof=unix_socket is None and udp is None))
+
+        await self.stopped.wait()
+        for server in self.servers:
+            server.close()
+        if reading is not None:
+            # Lines read after this would be queued behind the drain and lost.
+            reading.cancel()
+            await asyncio.gather(reading, return_exceptions=True)
+        await self.drain()
+        if unix_socket is not None and os.path.exists(unix_socket):
+            os.remove(unix_socket)
+
+    def stop(self):
+        """
+        Asks serve() to stop accepting input and drain the queues.
+
+        Returns:
+            - None
+        """
+        self.stopped.set()
+
+    async def drain(self, timeout=30):
+        """
+        Waits for queued messages to be sent, then stops the flushers.
+
+        Parameters:
+            - timeout: Seconds to wait before giving up on queued messages.
+
+        Returns:
+            - None
+        """
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self.queues.values())), timeout)
+        except asyncio.TimeoutError:
+            print("Timed out draining queues, dropping queued messages.")
+        for flusher in self.flushers.values():
+            flusher.cancel()
+        await asyncio.gather(*self.flushers.values(), return_exceptions=True)
+        self.queues = {}
+        self.flushers = {}
+
+    def _queue(self, route, priority):
+        key = (route, priority)
+        if key not in self.queues:
+            self.queues[key] = asyncio.Queue(self.max_queue)
+            self.flushers[key] = asyncio.ensure_future(self._flush(route, priority, self.queues[key]))
+        return self.queues[key]
+
+    async def _flush(self, route, priority, queue):
+        loop = asyncio.get_running_loop()
+        carry = None
+        while True:
+            batch = [carry if carry is not None else await queue.get()]
+            carry = None
+            size = len(batch[0])
+            deadline = loop.time() + self.batch_interval
+            while True:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    content = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if size + 1 + len(content) > MAX_MESSAGE_LENGTH:
+                    carry = content
+                    break
+                batch.append(content)
+                size += 1 + len(content)
+
+            try:
+                result = await self.discord_int.send_message("\n".join(batch), priority=priority, webhook_url=self.routes[route])
+            except Exception as e:
+                print(f"Failed to send batch to route {route}: {e}")
+                result = None
+            self.stats["batches"] += 1
+            if isinstance(result, str):
+                self.stats["sent"] += len(batch)
+            else:
+                self.stats["failed"] += len(batch)
+            for _ in batch:
+                queue.task_done()
+
+    async def _handle_stream(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                reply = self.handle_line(line)
+                if reply is not None:
+                    writer.write(json.dumps(reply).encode() + b"\n")
+                    await writer.drain()
+        finally:
+            writer.close()
+
+    async def _read_stdin(self, readline, stop_at_eof):
+        while True:
+            line = await readline()
+            if not line:
+                break
+            reply = self.handle_line(line)
+            if reply is not None:
+                print(json.dumps(reply), flush=True)
+        if stop_at_eof:
+            self.stop()
+
+
+def parse_routes(values):
+    routes = {}
+    for value in values:
+        name, separator, webhook_url = value.partition("=")
+        if not separator:
+            raise ValueError(f"Route must look like name=webhook_url: {value}")
+        routes[name] = webhook_url
+    return routes
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Forward line-delimited JSON messages to Discord webhooks.")
+    parser.add_argument("--route", action="append", default=[], help="A route as name=webhook_url, can be repeated.")
+    parser.add_argument("--default-route", help="The route used when a message does not name one.")
+    parser.add_argument("--unix-socket", help="Path of the Unix socket to listen on.")
+    parser.add_argument("--udp", help="host:port to listen on for UDP datagrams.")
+    parser.add_argument("--stdin", action="store_true", help="Read messages from stdin.")
+    parser.add_argument("--batch-interval", type=float, default=0.5, help="Seconds to collect messages into one.")
+    parser.add_argument("--max-queue", type=int, default=10000, help="Queued messages per route before dropping.")
+    args = parser.parse_args()
+
+    if args.unix_socket is None and args.udp is None and not args.stdin:
+        parser.error("At least one of --unix-socket, --udp or --stdin is required.")
+    try:
+        routes = parse_routes(args.route)
+    except ValueError as e:
+        parser.error(str(e))
+    if not routes:
+        parser.error("At least one --route is required.")
+    udp = None
+    if args.udp is not None:
+        host, _, port = args.udp.rpartition(":")
+        udp = (host or "127.0.0.1", int(port))
+
+    discord_int = DiscordIntegration({
+        "token": os.environ.get("DISCORD_BOT_TOKEN", ""),
+        "channel_id": os.environ.get("DISCORD_CHANNEL_ID", "")
+    })
+    daemon = DiscordDaemon(discord_int, routes, args.default_route, args.batch_interval, args.max_queue)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, daemon.stop)
+
+    try:
+        await daemon.serve(unix_socket=args.unix_socket, udp=udp, stdin=args.stdin)
+    finally:
+        await discord_int.close_session()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
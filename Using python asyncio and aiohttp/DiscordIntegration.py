@@ -1,24 +1,109 @@
-import aiohttp
 import asyncio
 import json
+import socket
+import time
+from urllib.parse import urlparse
+if __package__:
+    from .ConcurrencyLimiter import ConcurrencyLimiter
+    from .PriorityScheduler import PriorityScheduler, RateLimitBucket
+    from .RateLimitStore import MemoryRateLimitStore
+    from .TimerScheduler import TimerScheduler
+    from .Transport import AiohttpTransport
+else:
+    from ConcurrencyLimiter import ConcurrencyLimiter
+    from PriorityScheduler import PriorityScheduler, RateLimitBucket
+    from RateLimitStore import MemoryRateLimitStore
+    from TimerScheduler import TimerScheduler
+    from Transport import AiohttpTransport
+
+
+# Returned by send_message for a suppressed repeat whose first copy is still
+# being sent and has no ID yet. Like an ID, it is a string, so callers that
+# check for one count the repeat as delivered.
+PENDING = "pending"
 
 
 class DiscordIntegration:
-    def __init__(self, secrets):
+    def __init__(self, secrets, scheduler=None, rate_limit_store=None, deduplicator=None, message_index=None, transport=None, timers=None, limiter=None):
         """
         Initializes the DiscordIntegration object.
 
         Parameters:
             - secrets: A dictionary containing the required keys (token, channel_id).
+            - scheduler: A PriorityScheduler for outbound webhook requests.
+            - rate_limit_store: The store that holds rate-limit state, shared with
+              other processes when a FileRateLimitStore or RedisRateLimitStore is used.
+            - deduplicator: A MessageDeduplicator that collapses repeated messages. A background
+              task edits the repeat counts in every edit_interval seconds.
+            - message_index: A MessageIndex mapping upsert_message keys to message IDs,
+              in memory unless given a database path.
+            - transport: The HTTP transport, AiohttpTransport by default or Http2Transport
+              to multiplex concurrent requests over one HTTP/2 connection.
+            - timers: A TimerScheduler for scheduled sends and deletes, given a journal
+              path to keep pending timers across restarts.
+            - limiter: The ConcurrencyLimiter that adapts how many webhook requests run at once
+              to Discord's latency and 429s. Its current limit is in limiter.metrics().
         """
         self.token = secrets["token"]
         self.channel_id = secrets["channel_id"]
         self.webhook_url = None
         self.webhook_id = None
-        self.session = aiohttp.ClientSession()
+        self.webhook_info = None
+        self.limiter = limiter or ConcurrencyLimiter()
+        self.transport = transport or AiohttpTransport()
+        self.scheduler = scheduler or PriorityScheduler(limiter=self.limiter)
+        self.rate_limit_store = rate_limit_store or MemoryRateLimitStore()
+        self.rate_limits = {}
+        self.deduplicator = deduplicator
+        self.message_index = message_index
+        self.upsert_locks = {}
+        self.timers = timers or TimerScheduler()
+        self.flush_task = None
 
     async def close_session(self):
-        await self.session.close()
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            await asyncio.gather(self.flush_task, return_exceptions=True)
+            self.flush_task = None
+        await self.timers.stop()
+        await self.scheduler.stop()
+        await self.transport.close()
+        if self.message_index is not None:
+            self.message_index.close()
+
+    def _rate_limit(self, webhook_id):
+        if webhook_id not in self.rate_limits:
+            self.rate_limits[webhook_id] = RateLimitBucket(webhook_id, self.rate_limit_store)
+        return self.rate_limits[webhook_id]
+
+    async def _schedule(self, priority, webhook_id, method, url, **kwargs):
+        """
+        Runs a webhook request through the priority scheduler and waits for it.
+
+        Parameters:
+            - priority: The scheduler lane, e.g. "critical", "normal" or "bulk".
+            - webhook_id: The id of the webhook whose rate limit the request counts against.
+            - method: The HTTP method.
+            - url: The request URL.
+
+        Returns:
+            - response: The Response object.
+            - None: If the request was shed by the scheduler.
+        """
+        self.scheduler.start()
+        bucket = self._rate_limit(webhook_id)
+        return await self.scheduler.submit(priority, bucket, self._webhook_request, bucket, method, url, **kwargs)
+
+    async def _webhook_request(self, bucket, method, url, **kwargs):
+        started = time.monotonic()
+        response = await self.transport.request(method, url, **kwargs)
+        self.limiter.observe(time.monotonic() - started, response.status == 429)
+        try:
+            await bucket.update(response.status, response.headers)
+        except Exception as e:
+            # The request already went out, so its response must reach the caller.
+            print(f"Failed to update rate limit budget for {bucket.key}: {e}")
+        return response
 
     def use_webhook(self, webhook_url):
         """
@@ -56,14 +141,14 @@ class DiscordIntegration:
             "name": webhook_name
         }
 
-        async with self.session.post(url, headers=headers, data=json.dumps(data)) as response:
-            if response.status == 200:
-                webhook_info = await response.json()
-                self.webhook_url = webhook_info['url']
-                self.webhook_id = webhook_info['id']
-                return self.webhook_url
-            else:
-                return None
+        response = await self.transport.request("POST", url, headers=headers, data=json.dumps(data))
+        if response.status == 200:
+            webhook_info = response.json()
+            self.webhook_url = webhook_info['url']
+            self.webhook_id = webhook_info['id']
+            return self.webhook_url
+        else:
+            return None
 
     async def get_webhook_info(self, webhook_url=None):
         """
@@ -91,11 +176,51 @@ class DiscordIntegration:
             "Authorization": f"Bot {self.token}"
         }
 
-        async with self.session.get(url, headers=headers) as response:
-            if response.status == 200:
-                return await response.json()
-            else:
-                return None
+        response = await self.transport.request("GET", url, headers=headers)
+        if response.status == 200:
+            return response.json()
+        else:
+            return None
+
+    async def warmup(self, connections=4):
+        """
+        Prepares the integration so the first message goes out on a hot connection.
+
+        Resolves the webhook host, starts the scheduler, and validates the current
+        webhook with `connections` concurrent GET requests on the webhook URL, which
+        leaves that many keep-alive connections to the webhook host in the
+        transport pool. The webhook URL carries its own token, so no bot token is
+        needed. The webhook information is cached in webhook_info.
+
+        Parameters:
+            - connections: Number of connections to open.
+
+        Returns:
+            - webhook_info: The webhook information.
+            - None: If the webhook is not set or could not be validated.
+        """
+        if self.webhook_url is None or self.webhook_id is None:
+            print("Webhook URL or ID is not set. Use 'use_webhook' or 'create_webhook' first.")
+            return None
+
+        host = urlparse(self.webhook_url).hostname
+        try:
+            await asyncio.get_running_loop().getaddrinfo(host, 443, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            print(f"Failed to resolve {host}: {e}")
+
+        self.scheduler.start()
+        results = await asyncio.gather(*(self._validate_webhook() for _ in range(connections)))
+        self.webhook_info = next((info for info in results if info is not None), None)
+        if self.webhook_info is None:
+            print("Webhook validation failed during warmup.")
+        return self.webhook_info
+
+    async def _validate_webhook(self):
+        response = await self.transport.request("GET", self.webhook_url)
+        if response.status == 200:
+            return response.json()
+        return None
 
     async def get_all_webhooks(self):
         """
@@ -111,12 +236,12 @@ class DiscordIntegration:
             "Authorization": f"Bot {self.token}"
         }
 
-        async with self.session.get(url, headers=headers) as response:
-            if response.status == 200:
-                webhooks = await response.json()
-                return [{"name": webhook["name"], "url": webhook["url"]} for webhook in webhooks]
-            else:
-                return None
+        response = await self.transport.request("GET", url, headers=headers)
+        if response.status == 200:
+            webhooks = response.json()
+            return [{"name": webhook["name"], "url": webhook["url"]} for webhook in webhooks]
+        else:
+            return None
 
     async def update_webhook(self, webhook_name, webhook_url=None):
         """
@@ -147,8 +272,8 @@ class DiscordIntegration:
             "Authorization": f"Bot {self.token}",
             "Content-Type": "application/json"
         }
-        async with self.session.patch(url, data=json.dumps(payload), headers=headers) as response:
-            return response.status
+        response = await self.transport.request("PATCH", url, data=json.dumps(payload), headers=headers)
+        return response.status
 
     async def delete_webhook(self, webhook_url=None):
         """
@@ -175,27 +300,50 @@ class DiscordIntegration:
             "Authorization": f"Bot {self.token}"
         }
 
-        async with self.session.delete(url, headers=headers) as response:
-            if webhook_url is None and self.webhook_url is not None:
-                self.webhook_url = None
-                self.webhook_id = None
-            return response.status
+        response = await self.transport.request("DELETE", url, headers=headers)
+        if webhook_url is None and self.webhook_url is not None:
+            self.webhook_url = None
+            self.webhook_id = None
+        return response.status
 
-    async def send_message(self, message, image_url=None):
+    async def send_message(self, message, image_url=None, priority="normal", webhook_url=None, deduplicate=True):
         """
         Sends a message through the webhook.
 
         Parameters:
             - message: The message to be sent.
+            - priority: The scheduler lane to send the message in.
+            - webhook_url: The URL of the webhook to send through instead of the current one.
+            - deduplicate: Whether the deduplicator, if any, may collapse this message into an earlier copy.
 
         Returns:
-            - message_id: The ID of the sent message.
+            - message_id: The ID of the sent message, or of its first copy if it is
+              a repeat suppressed by the deduplicator.
+            - PENDING: If it is a repeat of a message that is still being sent.
             - response.status: If failed.
+            - None: If the message was shed by the scheduler.
         """
-        if self.webhook_url is None or self.webhook_id is None:
+        if webhook_url is None and (self.webhook_url is None or self.webhook_id is None):
             print("Webhook URL or ID is not set. Use 'use_webhook' or 'create_webhook' first.")
             return None
 
+        webhook_id = self.webhook_id
+        if webhook_url is not None:
+            url = webhook_url.split('/')
+            webhook_id = url[-2]
+        else:
+            webhook_url = self.webhook_url
+
+        deduplicate = deduplicate and self.deduplicator is not None
+        if deduplicate:
+            repeated = self.deduplicator.claim(message, image_url, webhook_url)
+            if repeated is not None:
+                if repeated.message_id is None:
+                    return PENDING
+                if self.flush_task is None:
+                    self.flush_task = asyncio.ensure_future(self._flush_repeats_periodically())
+                return repeated.message_id
+
         data = {
             'content': message
         }
@@ -210,50 +358,259 @@ class DiscordIntegration:
                     }
                 ]
             }
-        async with self.session.post(self.webhook_url + '?wait=true', json=data) as response:
-            if response.status == 200:
-                return (await response.json()).get('id')
-            return response.status
+        result = await self._schedule(priority, webhook_id, "POST", webhook_url + '?wait=true', json=data)
+        if result is None:
+            message_id = None
+        elif result.status == 200:
+            message_id = result.json().get('id')
+        else:
+            message_id = result.status
+        if deduplicate:
+            self.deduplicator.sent(message, image_url, webhook_url, message_id if isinstance(message_id, str) else None)
+        return message_id
+
+    async def flush_repeats(self, force=True):
+        """
+        Edits the repeat count into messages whose repeats were suppressed.
+
+        Parameters:
+            - force: Whether to edit every pending count, ignoring the deduplicator's edit_interval.
+
+        Returns:
+            - status_codes: A list of HTTP status codes of the edit requests.
+        """
+        if self.deduplicator is None:
+            return []
+        status_codes = []
+        for entry in self.deduplicator.due_edits(force):
+            status_codes.append(await self.edit_message(entry.message_id, entry.text(), priority="bulk", webhook_url=entry.webhook_url))
+        return status_codes
+
+    async def _flush_repeats_periodically(self):
+        while True:
+            await asyncio.sleep(self.deduplicator.edit_interval)
+            try:
+                await self.flush_repeats(force=False)
+            except Exception as e:
+                print(f"Failed to edit repeat counts: {e}")
+
+    async def schedule_message(self, message, send_at, image_url=None, priority="normal", webhook_url=None, delete_after=None):
+        """
+        Schedules a message to be sent at a given time.
+
+        Parameters:
+            - message: The message to be sent.
+            - send_at: Unix timestamp at which to send the message.
+            - image_url: The URL of an image to embed.
+            - priority: The scheduler lane to send the message in.
+            - webhook_url: The URL of the webhook to send through instead of the current one.
+            - delete_after: Seconds after sending to delete the message, if any.
+
+        Returns:
+            - timer_id: The ID of the timer, for cancel_timer.
+            - None: If no webhook is set.
+        """
+        webhook_url = webhook_url or self.webhook_url
+        if webhook_url is None:
+            print("Webhook URL or ID is not set. Use 'use_webhook' or 'create_webhook' first.")
+            return None
+
+        self.timers.start(self._fire_timer)
+        return self.timers.add(send_at, "send", {
+            "message": message,
+            "image_url": image_url,
+            "priority": priority,
+            "webhook_url": webhook_url,
+            "delete_after": delete_after
+        })
+
+    async def delete_message_after(self, message_id, delay, priority="bulk", webhook_url=None):
+        """
+        Schedules a message sent through the webhook to be deleted.
+
+        Parameters:
+            - message_id: The ID of the message to be deleted.
+            - delay: Seconds from now after which to delete the message.
+            - priority: The scheduler lane to send the delete in.
+            - webhook_url: The URL of the webhook the message was sent through instead of the current one.
+
+        Returns:
+            - timer_id: The ID of the timer, for cancel_timer.
+            - None: If no webhook is set.
+        """
+        webhook_url = webhook_url or self.webhook_url
+        if webhook_url is None:
+            print("Webhook URL or ID is not set. Use 'use_webhook' or 'create_webhook' first.")
+            return None
+
+        self.timers.start(self._fire_timer)
+        return self.timers.add(time.time() + delay, "delete", {
+            "message_id": message_id,
+            "priority": priority,
+            "webhook_url": webhook_url
+        })
+
+    async def send_ephemeral(self, message, ttl, image_url=None, priority="normal", webhook_url=None):
+        """
+        Sends a message that is deleted after ttl seconds.
+
+        Parameters:
+            - message: The message to be sent.
+            - ttl: Seconds after which to delete the message.
+            - image_url: The URL of an image to embed.
+            - priority: The scheduler lane to send the message in.
+            - webhook_url: The URL of the webhook to send through instead of the current one.
+
+        Returns:
+            - message_id: The ID of the sent message.
+            - response.status: If failed.
+            - None: If the message was shed by the scheduler.
+        """
+        message_id = await self.send_message(message, image_url, priority, webhook_url)
+        if isinstance(message_id, str):
+            await self.delete_message_after(message_id, ttl, webhook_url=webhook_url)
+        return message_id
+
+    def cancel_timer(self, timer_id):
+        """
+        Cancels a scheduled send or delete.
+
+        Parameters:
+            - timer_id: The ID returned by schedule_message or delete_message_after.
+
+        Returns:
+            - True: If the timer was pending.
+            - False: If it already fired or does not exist.
+        """
+        return self.timers.cancel(timer_id)
+
+    async def resume_timers(self):
+        """
+        Starts firing timers loaded from the TimerScheduler journal.
+
+        Returns:
+            - pending: The number of pending timers.
+        """
+        self.timers.start(self._fire_timer)
+        return self.timers.pending()
+
+    async def _fire_timer(self, action, args):
+        if action == "send":
+            message_id = await self.send_message(args["message"], args["image_url"], args["priority"], args["webhook_url"])
+            if args["delete_after"] is not None and isinstance(message_id, str):
+                await self.delete_message_after(message_id, args["delete_after"], webhook_url=args["webhook_url"])
+        elif action == "delete":
+            await self.delete_message(args["message_id"], args["priority"], args["webhook_url"])
+
+    async def upsert_message(self, key, message, priority="normal", webhook_url=None):
+        """
+        Sends a message for a key, or edits the message already sent for it.
+        Upserts of the same key run one at a time, so the key never ends up with two messages.
+
+        Parameters:
+            - key: The application key identifying the message, e.g. "deploy-status".
+            - message: The message content.
+            - priority: The scheduler lane to send the message or edit in.
+            - webhook_url: The URL of the webhook to send through instead of the current one.
+
+        Returns:
+            - message_id: The ID of the sent or edited message.
+            - status_code: HTTP status code if sending or editing failed.
+            - None: If the request was shed by the scheduler or no webhook is set.
+        """
+        if webhook_url is None and (self.webhook_url is None or self.webhook_id is None):
+            print("Webhook URL or ID is not set. Use 'use_webhook' or 'create_webhook' first.")
+            return None
 
-    async def edit_message(self, message_id, new_message):
+        webhook_id = self.webhook_id if webhook_url is None else webhook_url.split('/')[-2]
+        if self.message_index is None:
+            # Imported here so sending alone never loads sqlite3.
+            if __package__:
+                from .MessageIndex import MessageIndex
+            else:
+                from MessageIndex import MessageIndex
+            self.message_index = MessageIndex()
+
+        # Concurrent upserts of a key would both miss the index and post twice.
+        lock = self.upsert_locks.setdefault((webhook_id, key), asyncio.Lock())
+        async with lock:
+            message_id = self.message_index.get(webhook_id, key)
+            if message_id is not None:
+                status_code = await self.edit_message(message_id, message, priority, webhook_url)
+                if status_code == 200:
+                    return message_id
+                if status_code != 404:
+                    return status_code
+                # The message was deleted, so post a new one for the key.
+                self.message_index.delete(webhook_id, key)
+
+            # Each key owns its message, so an upsert must not be collapsed into another key's copy.
+            message_id = await self.send_message(message, priority=priority, webhook_url=webhook_url, deduplicate=False)
+            if isinstance(message_id, str):
+                self.message_index.set(webhook_id, key, message_id)
+            return message_id
+
+    async def edit_message(self, message_id, new_message, priority="normal", webhook_url=None):
         """
         Edits a message sent through the webhook.
 
         Parameters:
             - message_id: The ID of the message to be edited.
             - new_message: The new content of the message.
+            - priority: The scheduler lane to send the edit in.
+            - webhook_url: The URL of the webhook the message was sent through instead of the current one.
 
         Returns:
             - status_code: HTTP status code of the edit request.
         """
-        if self.webhook_url is None or self.webhook_id is None:
+        if webhook_url is None and (self.webhook_url is None or self.webhook_id is None):
             print("Webhook URL or ID is not set. Use 'use_webhook' or 'create_webhook' first.")
             return None
 
-        edit_url = f"{self.webhook_url}/messages/{message_id}"
+        webhook_id = self.webhook_id
+        if webhook_url is not None:
+            url = webhook_url.split('/')
+            webhook_id = url[-2]
+        else:
+            webhook_url = self.webhook_url
+
+        edit_url = f"{webhook_url}/messages/{message_id}"
         data = {
             'content': new_message
         }
-        async with self.session.patch(edit_url, json=data) as response:
-            return response.status
+        result = await self._schedule(priority, webhook_id, "PATCH", edit_url, json=data)
+        if result is None:
+            return None
+        return result.status
 
-    async def delete_message(self, message_id):
+    async def delete_message(self, message_id, priority="normal", webhook_url=None):
         """
         Deletes a message sent through the webhook.
 
         Parameters:
             - message_id: The ID of the message to be deleted.
+            - priority: The scheduler lane to send the delete in.
+            - webhook_url: The URL of the webhook the message was sent through instead of the current one.
 
         Returns:
             - status_code: HTTP status code of the delete request.
         """
-        if self.webhook_url is None or self.webhook_id is None:
+        if webhook_url is None and (self.webhook_url is None or self.webhook_id is None):
             print("Webhook URL or ID is not set. Use 'use_webhook' or 'create_webhook' first.")
             return None
 
-        delete_url = f"{self.webhook_url}/messages/{message_id}"
-        async with self.session.delete(delete_url) as response:
-            return response.status
+        webhook_id = self.webhook_id
+        if webhook_url is not None:
+            url = webhook_url.split('/')
+            webhook_id = url[-2]
+        else:
+            webhook_url = self.webhook_url
+
+        delete_url = f"{webhook_url}/messages/{message_id}"
+        result = await self._schedule(priority, webhook_id, "DELETE", delete_url)
+        if result is None:
+            return None
+        return result.status
 
     async def get_message(self, message_id):
         """
@@ -272,11 +629,43 @@ class DiscordIntegration:
             "Authorization": f"Bot {self.token}"
         }
 
-        async with self.session.get(url, headers=headers) as response:
-            if response.status == 200:
-                return await response.json()
-            else:
-                return None
+        response = await self.transport.request("GET", url, headers=headers)
+        if response.status == 200:
+            return response.json()
+        else:
+            return None
+
+    async def get_messages(self, after="0", limit=100, channel_id=None):
+        """
+        Retrieves one page of channel history, oldest first.
+
+        Requests go through the "bulk" scheduler lane and count against the
+        channel's own rate limit, so paging through history does not hold up
+        webhook messages.
+
+        Parameters:
+            - after: Only messages with an ID greater than this are returned.
+            - limit: Maximum number of messages in the page, at most 100.
+            - channel_id: The channel to read instead of the configured one.
+
+        Returns:
+            - messages: A list of message dictionaries sorted by ID.
+            - status_code: HTTP status code if failed.
+            - None: If the request was shed by the scheduler.
+        """
+        channel_id = channel_id or self.channel_id
+        url = f"https://discord.com/api/v9/channels/{channel_id}/messages?after={after}&limit={limit}"
+
+        headers = {
+            "Authorization": f"Bot {self.token}"
+        }
+
+        response = await self._schedule("bulk", f"channel-{channel_id}", "GET", url, headers=headers)
+        if response is None:
+            return None
+        if response.status == 200:
+            return sorted(response.json(), key=lambda message: int(message["id"]))
+        return response.status
 
     async def get_pinned_messages(self):
         """
@@ -293,13 +682,13 @@ class DiscordIntegration:
             "Content-Type": "application/json"
         }
 
-        async with self.session.get(url, headers=headers) as response:
-            if response.status == 200:
-                pinned_messages = []
-                for i in await response.json():
-                    pinned_messages.append(i["id"])
-                return pinned_messages
-            return [response.status]
+        response = await self.transport.request("GET", url, headers=headers)
+        if response.status == 200:
+            pinned_messages = []
+            for i in response.json():
+                pinned_messages.append(i["id"])
+            return pinned_messages
+        return [response.status]
 
     async def pin_message(self, message_id):
         """
@@ -318,8 +707,8 @@ class DiscordIntegration:
             "Content-Type": "application/json"
         }
 
-        async with self.session.put(url, headers=headers) as response:
-            return response.status
+        response = await self.transport.request("PUT", url, headers=headers)
+        return response.status
 
     async def unpin_message(self, message_id):
         """
@@ -338,65 +727,5 @@ class DiscordIntegration:
             "Content-Type": "application/json"
         }
 
-        async with self.session.delete(url, headers=headers) as response:
-            return response.status
-
-
-async def main():
-    # Create DiscordIntegration object
-    discord_int = DiscordIntegration({"token": "MTIxOTU1NTUyNTc3NjI0ODgzMg.GNUJxw.P3qoic93MyvUeEsQ2l4oqOHnNT3t-4XAUoJWKs", "channel_id": "1220124696809308324"})
-
-    webhooks = await discord_int.get_all_webhooks()
-    if webhooks is not None:
-        print("All Webhooks:")
-        for webhook in webhooks:
-            print(f"Name: {webhook['name']}, URL: {webhook['url']}")
-            discord_int.use_webhook(webhook['url'])
-    else:
-        print("Failed to retrieve webhooks.")
-
-    # Get Webhook Info
-    response = await discord_int.get_webhook_info()
-    print("Webhook info: ", response)
-
-    # Send a message and get message ID
-    message = "Hello, this is a test message!"
-    message_id = await discord_int.send_message(message)
-    print("Sent Message ID:", message_id)
-
-    # Pin the message
-    pin_status = await discord_int.pin_message(message_id)
-    print("Pin Message Status Code:", pin_status)
-
-    # Get all pinned messages
-    pinned_messages = await discord_int.get_pinned_messages()
-    print("Pinned Messages:", pinned_messages)
-
-    # Unpin the message
-    unpin_status = await discord_int.unpin_message(message_id)
-    print("Unpin Message Status Code:", unpin_status)
-
-    # Edit the message
-    edited_message = "This message has been edited!"
-    edit_status = await discord_int.edit_message(message_id, edited_message)
-    print("Edit Message Status Code:", edit_status)
-
-    # Get the edited message
-    edited_message_data = await discord_int.get_message(message_id)
-    print("Edited Message Data:", edited_message_data)
-
-    # Delete the message
-    delete_status = await discord_int.delete_message(message_id)
-    print("Delete Message Status Code:", delete_status)
-
-    # Send a message and get message ID
-    message = "Hello, this is a test message!"
-    message_id = await discord_int.send_message(message, "https://images.ctfassets.net/hrltx12pl8hq/28ECAQiPJZ78hxatLTa7Ts/2f695d869736ae3b0de3e56ceaca3958/free-nature-images.jpg?fit=fill&w=1200&h=630")
-    print("Sent Message ID:", message_id)
-
-    # Close the session
-    await discord_int.close_session()
-
-if __name__ == "__main__":
-    asyncio.run(main())
-
+        response = await self.transport.request("DELETE", url, headers=headers)
+        return response.status
@@ -0,0 +1,133 @@
+import hashlib
+import time
+from collections import OrderedDict, deque
+
+
+MAX_MESSAGE_LENGTH = 2000
+
+
+class RepeatedMessage:
+    def __init__(self, content, webhook_url, now):
+        self.content = content
+        self.webhook_url = webhook_url
+        self.message_id = None
+        self.first_seen = now
+        self.last_edit = now
+        self.count = 1
+        self.reported = 1
+
+    def text(self):
+        suffix = f"\n(repeated {self.count} times)"
+        return self.content[:MAX_MESSAGE_LENGTH - len(suffix)] + suffix
+
+
+class MessageDeduplicator:
+    def __init__(self, window=60, max_entries=10000, edit_interval=10):
+        """
+        Initializes the MessageDeduplicator object.
+
+        Messages are indexed by a hash of their content and webhook. A repeat
+        seen within window seconds of the first copy is not sent again; instead
+        the first copy is edited at most every edit_interval seconds to say how
+        many times it was repeated. The index keeps at most max_entries
+        messages and evicts the oldest first, so memory stays bounded no matter
+        how many distinct messages are sent.
+
+        Parameters:
+            - window: Seconds during which repeats of a message are suppressed.
+            - max_entries: Maximum number of distinct messages kept in the index.
+            - edit_interval: Minimum seconds between two repeat count edits of a message.
+        """
+        self.window = window
+        self.max_entries = max_entries
+        self.edit_interval = edit_interval
+        self.entries = OrderedDict()
+        self.repeated = {}
+        self.expired = deque(maxlen=max_entries)
+        self.suppressed = 0
+
+    def claim(self, content, image_url, webhook_url):
+        """
+        Records a message about to be sent.
+
+        Parameters:
+            - content: The message content.
+            - image_url: The embedded image URL, if any.
+            - webhook_url: The URL of the webhook the message is sent through.
+
+        Returns:
+            - None: If the message is new and should be sent.
+            - entry: The RepeatedMessage of the first copy if this is a repeat.
+        """
+        key = message_key(content, image_url, webhook_url)
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is not None and now - entry.first_seen < self.window:
+            entry.count += 1
+            self.suppressed += 1
+            self.repeated[key] = entry
+            return entry
+        if entry is not None:
+            self._expire(key)
+        self.entries[key] = RepeatedMessage(content, webhook_url, now)
+        while len(self.entries) > self.max_entries:
+            self._expire(next(iter(self.entries)))
+        return None
+
+    def sent(self, content, image_url, webhook_url, message_id):
+        """
+        Records the result of sending a new message.
+
+        Parameters:
+            - content: The message content.
+            - image_url: The embedded image URL, if any.
+            - webhook_url: The URL of the webhook the message was sent through.
+            - message_id: The ID of the sent message, or None if sending failed.
+
+        Returns:
+            - None
+        """
+        key = message_key(content, image_url, webhook_url)
+        entry = self.entries.get(key)
+        if entry is None or entry.message_id is not None:
+            return
+        if message_id is None:
+            # Let the next copy be sent instead of suppressing it behind a failure.
+            del self.entries[key]
+            self.repeated.pop(key, None)
+        else:
+            entry.message_id = message_id
+
+    def due_edits(self, force=False):
+        """
+        Collects the messages whose repeat count should be edited in.
+
+        Parameters:
+            - force: Whether to ignore edit_interval, e.g. before shutting down.
+
+        Returns:
+            - edits: A list of RepeatedMessage objects, marked as reported.
+        """
+        now = time.time()
+        edits = list(self.expired)
+        self.expired.clear()
+        for key, entry in list(self.repeated.items()):
+            if entry.message_id is None:
+                continue
+            if force or now - entry.last_edit >= self.edit_interval:
+                edits.append(entry)
+                del self.repeated[key]
+        for entry in edits:
+            entry.reported = entry.count
+            entry.last_edit = now
+        return edits
+
+    def _expire(self, key):
+        entry = self.entries.pop(key)
+        self.repeated.pop(key, None)
+        if entry.message_id is not None and entry.count > entry.reported:
+            self.expired.append(entry)
+
+
+def message_key(content, image_url, webhook_url):
+    return hashlib.sha1(f"{webhook_url}\0{image_url}\0{content}".encode()).digest()
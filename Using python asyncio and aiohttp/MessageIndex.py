@@ -0,0 +1,100 @@
+import sqlite3
+import time
+
+
+class MessageIndex:
+    def __init__(self, path=":memory:", max_entries=100000):
+        """
+        Initializes the MessageIndex object.
+
+        Maps application keys to the IDs of the messages sent for them, per
+        webhook, in an SQLite table keyed by (webhook_id, key). Lookups are a
+        single primary key probe. Once more than max_entries keys are stored the
+        least recently updated ones are evicted, which bounds the file size.
+
+        Parameters:
+            - path: The path of the SQLite database, or ":memory:" to keep the index in memory.
+            - max_entries: Maximum number of keys kept in the index.
+        """
+        self.max_entries = max_entries
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "webhook_id TEXT NOT NULL, key TEXT NOT NULL, message_id TEXT NOT NULL, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (webhook_id, key)) WITHOUT ROWID"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS messages_updated_at ON messages (updated_at)")
+        self.connection.commit()
+        self.count = self.connection.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def get(self, webhook_id, key):
+        """
+        Looks up the message sent for a key.
+
+        Parameters:
+            - webhook_id: The ID of the webhook the message was sent through.
+            - key: The application key.
+
+        Returns:
+            - message_id: The ID of the message.
+            - None: If the key is not in the index.
+        """
+        row = self.connection.execute(
+            "SELECT message_id FROM messages WHERE webhook_id = ? AND key = ?", (webhook_id, key)
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def set(self, webhook_id, key, message_id):
+        """
+        Stores the message sent for a key.
+
+        Parameters:
+            - webhook_id: The ID of the webhook the message was sent through.
+            - key: The application key.
+            - message_id: The ID of the message.
+
+        Returns:
+            - None
+        """
+        updated = self.connection.execute(
+            "UPDATE messages SET message_id = ?, updated_at = ? WHERE webhook_id = ? AND key = ?",
+            (message_id, time.time(), webhook_id, key)
+        ).rowcount
+        if not updated:
+            self.connection.execute(
+                "INSERT INTO messages (webhook_id, key, message_id, updated_at) VALUES (?, ?, ?, ?)",
+                (webhook_id, key, message_id, time.time())
+            )
+            self.count += 1
+            if self.count > self.max_entries:
+                self._evict()
+        self.connection.commit()
+
+    def delete(self, webhook_id, key):
+        """
+        Removes a key from the index.
+
+        Parameters:
+            - webhook_id: The ID of the webhook the message was sent through.
+            - key: The application key.
+
+        Returns:
+            - None
+        """
+        self.count -= self.connection.execute(
+            "DELETE FROM messages WHERE webhook_id = ? AND key = ?", (webhook_id, key)
+        ).rowcount
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def _evict(self):
+        # Evict a small batch at once so a full index does not delete on every insert.
+        excess = self.count - self.max_entries + self.max_entries // 100
+        self.count -= self.connection.execute(
+            "DELETE FROM messages WHERE (webhook_id, key) IN "
+            "(SELECT webhook_id, key FROM messages ORDER BY updated_at LIMIT ?)", (excess,)
+        ).rowcount
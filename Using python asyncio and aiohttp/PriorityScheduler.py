@@ -0,0 +1,287 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+if __package__:
+    from .RateLimitStore import MemoryRateLimitStore
+else:
+    from RateLimitStore import MemoryRateLimitStore
+
+
+DEFAULT_LANES = {
+    "critical": 8,
+    "normal": 4,
+    "bulk": 1
+}
+
+# Seconds to send without reserving after the rate limit store fails, instead
+# of trying to reach it again for every job.
+STORE_RETRY_INTERVAL = 5
+
+
+class RateLimitBucket:
+    def __init__(self, key="default", store=None):
+        """
+        Tracks the rate-limit budget Discord reports for one webhook.
+
+        The budget is learned from the X-RateLimit-* headers of each response,
+        so until the first response arrives requests are not held back.
+
+        Parameters:
+            - key: The bucket key, usually the webhook id.
+            - store: The store that holds the budget, shared between processes
+              with FileRateLimitStore or RedisRateLimitStore.
+        """
+        self.key = key
+        self.store = store or MemoryRateLimitStore()
+
+    async def reserve(self):
+        """
+        Takes one request from the budget if any is left.
+
+        Returns:
+            - 0: If a request was reserved.
+            - delay: Seconds to wait before the budget is refilled.
+        """
+        return await self.store.reserve(self.key)
+
+    async def update(self, status, headers):
+        """
+        Updates the budget from a Discord response.
+
+        Parameters:
+            - status: HTTP status code of the response.
+            - headers: The response headers.
+
+        Returns:
+            - None
+        """
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset_after = headers.get("X-RateLimit-Reset-After")
+        if status == 429:
+            remaining = 0
+            reset_after = headers.get("Retry-After", reset_after)
+        if remaining is None or reset_after is None:
+            return
+        await self.store.update(self.key, int(remaining), float(reset_after))
+
+
+class PriorityScheduler:
+    def __init__(self, lanes=None, max_backlog=None, overflow_policy="drop", sample_every=10, limiter=None):
+        """
+        Initializes the PriorityScheduler object.
+
+        Jobs are queued per lane and dispatched by smooth weighted round robin,
+        so a lane with weight 8 gets eight slots of the rate-limit budget for
+        every slot of a lane with weight 1 while both have work queued.
+
+        Within a lane jobs are queued per bucket. A bucket that is out of
+        budget is parked until it refills, and jobs for other buckets in the
+        lane go ahead, so one throttled webhook does not hold up the others.
+
+        Parameters:
+            - lanes: A dictionary of lane name to weight, highest priority first.
+            - max_backlog: Number of queued jobs after which the lowest lane is shed.
+            - overflow_policy: "drop" to reject lowest lane jobs on overflow,
+              "sample" to keep one in every sample_every of them.
+            - sample_every: Sampling interval used by the "sample" policy.
+            - limiter: A ConcurrencyLimiter bounding the jobs running at once, or None for no bound.
+              Jobs wait in their lane for a slot, so the lane weights still apply.
+        """
+        if overflow_policy not in ("drop", "sample"):
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+
+        self.lanes = dict(lanes or DEFAULT_LANES)
+        self.lowest_lane = list(self.lanes)[-1]
+        self.queues = {lane: OrderedDict() for lane in self.lanes}
+        self.sizes = {lane: 0 for lane in self.lanes}
+        self.parked = {}
+        self.store_down_until = 0
+        self.current_weights = {lane: 0 for lane in self.lanes}
+        self.max_backlog = max_backlog
+        self.overflow_policy = overflow_policy
+        self.sample_every = sample_every
+        self.overflow_count = 0
+        self.dropped = 0
+        self.limiter = limiter
+        self.wakeup = None
+        self.task = None
+        self.running_jobs = set()
+
+    def start(self):
+        """
+        Starts the dispatcher task on the running event loop.
+
+        Returns:
+            - None
+        """
+        if self.task is not None:
+            return
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.ensure_future(self._dispatch())
+
+    async def stop(self):
+        """
+        Stops the dispatcher task and waits for dispatched jobs.
+        Jobs still queued are resolved with None.
+
+        Returns:
+            - None
+        """
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        if self.running_jobs:
+            await asyncio.gather(*self.running_jobs, return_exceptions=True)
+        for lane, buckets in self.queues.items():
+            for jobs in buckets.values():
+                for job in jobs:
+                    if not job[0].done():
+                        job[0].set_result(None)
+            buckets.clear()
+            self.sizes[lane] = 0
+        self.parked.clear()
+
+    def backlog(self):
+        """
+        Returns the number of queued jobs per lane.
+
+        Returns:
+            - backlog: A dictionary of lane name to queued job count.
+        """
+        return dict(self.sizes)
+
+    def submit(self, lane, bucket, coro_fn, *args, **kwargs):
+        """
+        Queues a job in a lane.
+
+        Parameters:
+            - lane: The lane name, one of the configured lanes.
+            - bucket: The RateLimitBucket the job draws from.
+            - coro_fn: The coroutine function to run.
+
+        Returns:
+            - future: An asyncio Future resolved with the job result, or None if shed.
+        """
+        if lane not in self.queues:
+            raise ValueError(f"Unknown lane: {lane}")
+
+        future = asyncio.get_running_loop().create_future()
+        if lane == self.lowest_lane and self._overflowing():
+            self.overflow_count += 1
+            if self.overflow_policy == "drop" or self.overflow_count % self.sample_every != 0:
+                self.dropped += 1
+                future.set_result(None)
+                return future
+        self.queues[lane].setdefault(bucket, deque()).append((future, bucket, coro_fn, args, kwargs))
+        self.sizes[lane] += 1
+        if self.wakeup is not None:
+            self.wakeup.set()
+        return future
+
+    def _overflowing(self):
+        if self.max_backlog is None:
+            return False
+        return sum(self.sizes.values()) >= self.max_backlog
+
+    def _ready_lanes(self, now):
+        return [lane for lane in self.lanes
+                if any(self.parked.get(bucket, 0) <= now for bucket in self.queues[lane])]
+
+    def _next_lane(self, ready):
+        return max(ready, key=lambda lane: self.current_weights[lane] + self.lanes[lane])
+
+    def _charge(self, lane, ready):
+        for name in ready:
+            self.current_weights[name] += self.lanes[name]
+        self.current_weights[lane] -= sum(self.lanes[name] for name in ready)
+
+    async def _reserve(self, bucket):
+        if time.monotonic() < self.store_down_until:
+            return 0
+        try:
+            return await bucket.reserve()
+        except Exception as e:
+            # An unreachable store must not stop the dispatcher. Sending anyway
+            # leaves the throttling to Discord's 429s until the store is back.
+            print(f"Failed to reserve rate limit budget for {bucket.key}: {e}")
+            self.store_down_until = time.monotonic() + STORE_RETRY_INTERVAL
+            return 0
+
+    async def _next_job(self):
+        """
+        Takes the next job whose bucket has budget left.
+
+        Returns:
+            - job: The job to dispatch, or None if every queued bucket is parked.
+            - timeout: Seconds until the first parked bucket refills, or None
+              if nothing is queued.
+        """
+        while True:
+            now = time.monotonic()
+            ready = self._ready_lanes(now)
+            if not ready:
+                waits = [self.parked[bucket] - now for buckets in self.queues.values() for bucket in buckets]
+                return None, min(waits) if waits else None
+            # The lane is only charged once a job is dispatched, so a higher
+            # priority job queued while buckets are parked still wins.
+            lane = self._next_lane(ready)
+            buckets = self.queues[lane]
+            for bucket in list(buckets):
+                if self.parked.get(bucket, 0) > now:
+                    continue
+                delay = await self._reserve(bucket)
+                if delay > 0:
+                    self.parked[bucket] = now + delay
+                    continue
+                self.parked.pop(bucket, None)
+                self._charge(lane, ready)
+                job = buckets[bucket].popleft()
+                if buckets[bucket]:
+                    # Buckets in a lane take turns.
+                    buckets.move_to_end(bucket)
+                else:
+                    del buckets[bucket]
+                self.sizes[lane] -= 1
+                return job, None
+
+    async def _wait(self, timeout=None):
+        self.wakeup.clear()
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _dispatch(self):
+        while True:
+            if self.limiter is not None and not self.limiter.try_acquire():
+                # _run wakes the dispatcher once a job finishes and frees a slot.
+                await self._wait()
+                continue
+            job, timeout = await self._next_job()
+            if job is None:
+                if self.limiter is not None:
+                    self.limiter.release()
+                await self._wait(timeout)
+                continue
+            task = asyncio.ensure_future(self._run(*job))
+            self.running_jobs.add(task)
+            task.add_done_callback(self.running_jobs.discard)
+
+    async def _run(self, future, bucket, coro_fn, args, kwargs):
+        try:
+            result = await coro_fn(*args, **kwargs)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        finally:
+            if self.limiter is not None:
+                self.limiter.release()
+                self.wakeup.set()
+        if not future.done():
+            future.set_result(result)
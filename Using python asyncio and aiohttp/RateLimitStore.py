@@ -0,0 +1,266 @@
+import asyncio
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+class MemoryRateLimitStore:
+    def __init__(self):
+        """
+        Keeps rate-limit state in this process only.
+        """
+        self.buckets = {}
+
+    async def reserve(self, key):
+        """
+        Takes one request from the budget of a bucket if any is left.
+
+        Parameters:
+            - key: The bucket key, usually the webhook id.
+
+        Returns:
+            - 0: If a request was reserved or the budget is unknown.
+            - delay: Seconds to wait before the budget is refilled.
+        """
+        return _reserve(self.buckets, key, time.time())
+
+    async def update(self, key, remaining, reset_after):
+        """
+        Stores the budget Discord reported for a bucket.
+
+        Parameters:
+            - key: The bucket key, usually the webhook id.
+            - remaining: Requests left in the current window.
+            - reset_after: Seconds until the window resets.
+
+        Returns:
+            - None
+        """
+        self.buckets[key] = [remaining, time.time() + reset_after]
+
+
+class FileRateLimitStore:
+    def __init__(self, path):
+        """
+        Shares rate-limit state between processes on one host through a
+        JSON file guarded by an exclusive file lock. The blocking file
+        operations run in a worker thread to keep the event loop free.
+
+        Parameters:
+            - path: The path of the state file, created if missing.
+        """
+        self.path = path
+        self.lock = threading.Lock()
+
+    async def reserve(self, key):
+        """
+        Takes one request from the budget of a bucket if any is left.
+
+        Parameters:
+            - key: The bucket key, usually the webhook id.
+
+        Returns:
+            - 0: If a request was reserved or the budget is unknown.
+            - delay: Seconds to wait before the budget is refilled.
+        """
+        return await asyncio.to_thread(self._reserve, key)
+
+    async def update(self, key, remaining, reset_after):
+        """
+        Stores the budget Discord reported for a bucket.
+
+        Parameters:
+            - key: The bucket key, usually the webhook id.
+            - remaining: Requests left in the current window.
+            - reset_after: Seconds until the window resets.
+
+        Returns:
+            - None
+        """
+        await asyncio.to_thread(self._update, key, remaining, reset_after)
+
+    def _reserve(self, key):
+        with self.lock, _locked_file(self.path) as f:
+            buckets = _read_state(f)
+            delay = _reserve(buckets, key, time.time())
+            _write_state(f, buckets)
+            return delay
+
+    def _update(self, key, remaining, reset_after):
+        with self.lock, _locked_file(self.path) as f:
+            now = time.time()
+            buckets = _read_state(f)
+            # Expired buckets are dropped so the file only holds live windows.
+            buckets = {name: bucket for name, bucket in buckets.items() if bucket[1] > now}
+            buckets[key] = [remaining, now + reset_after]
+            _write_state(f, buckets)
+
+
+class RedisRateLimitStore:
+    def __init__(self, host="127.0.0.1", port=6379, prefix="discord:ratelimit:", timeout=1.0):
+        """
+        Shares rate-limit state between hosts through a Redis-protocol server.
+
+        Each bucket is a counter key whose expiry is the end of the window, so
+        reserving is a single DECR and stale windows disappear on their own.
+
+        Parameters:
+            - host: The server host.
+            - port: The server port.
+            - prefix: The prefix added to every bucket key.
+            - timeout: Timeout in seconds for each command.
+        """
+        self.host = host
+        self.port = port
+        self.prefix = prefix
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+        self.lock = None
+
+    async def close(self):
+        """
+        Closes the connection to the server.
+
+        Returns:
+            - None
+        """
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+            self.reader = None
+            self.writer = None
+
+    async def reserve(self, key):
+        """
+        Takes one request from the budget of a bucket if any is left.
+
+        Parameters:
+            - key: The bucket key, usually the webhook id.
+
+        Returns:
+            - 0: If a request was reserved or the budget is unknown.
+            - delay: Seconds to wait before the budget is refilled.
+        """
+        key = self.prefix + key
+        if await self._command("GET", key) is None:
+            return 0
+        if await self._command("DECR", key) >= 0:
+            return 0
+        ttl = await self._command("PTTL", key)
+        if ttl < 0:
+            # The window expired between GET and DECR, which left a counter
+            # without expiry behind; drop it so the budget is unknown again.
+            await self._command("DEL", key)
+            return 0
+        return ttl / 1000
+
+    async def update(self, key, remaining, reset_after):
+        """
+        Stores the budget Discord reported for a bucket.
+
+        Parameters:
+            - key: The bucket key, usually the webhook id.
+            - remaining: Requests left in the current window.
+            - reset_after: Seconds until the window resets.
+
+        Returns:
+            - None
+        """
+        ttl = max(int(reset_after * 1000), 1)
+        await self._command("SET", self.prefix + key, remaining, "PX", ttl)
+
+    async def _command(self, *args):
+        request = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            arg = str(arg).encode()
+            request.append(f"${len(arg)}\r\n".encode() + arg + b"\r\n")
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            if self.writer is None:
+                self.reader, self.writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), self.timeout)
+            try:
+                self.writer.write(b"".join(request))
+                await self.writer.drain()
+                return await asyncio.wait_for(_read_reply(self.reader), self.timeout)
+            except (OSError, asyncio.TimeoutError):
+                self.writer.close()
+                self.reader = None
+                self.writer = None
+                raise
+
+
+def _reserve(buckets, key, now):
+    bucket = buckets.get(key)
+    if bucket is None:
+        return 0
+    remaining, reset_at = bucket
+    if now >= reset_at:
+        del buckets[key]
+        return 0
+    if remaining > 0:
+        bucket[0] = remaining - 1
+        return 0
+    return reset_at - now
+
+
+@contextmanager
+def _locked_file(path):
+    with open(path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            yield f
+            return
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield f
+        finally:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _read_state(f):
+    f.seek(0)
+    data = f.read()
+    if not data:
+        return {}
+    return json.loads(data)
+
+
+def _write_state(f, buckets):
+    f.seek(0)
+    f.truncate()
+    f.write(json.dumps(buckets))
+    f.flush()
+
+
+async def _read_reply(reader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed by server")
+    kind, value = line[:1], line[1:-2]
+    if kind == b"+":
+        return value.decode()
+    if kind == b"-":
+        raise RuntimeError(value.decode())
+    if kind == b":":
+        return int(value)
+    if kind == b"$":
+        length = int(value)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2].decode()
+    if kind == b"*":
+        return [await _read_reply(reader) for _ in range(int(value))]
+    raise RuntimeError(f"Unexpected reply: {line!r}")
@@ -0,0 +1,200 @@
+import asyncio
+import heapq
+import json
+import os
+import time
+import uuid
+
+
+class TimerScheduler:
+    def __init__(self, path=None, batch_window=0.05):
+        """
+        Initializes the TimerScheduler object.
+
+        Timers are kept in a heap ordered by due time, so adding one is
+        O(log n) and a single task sleeps until the earliest is due. Every timer
+        due within batch_window seconds of that is fired in the same batch.
+        Cancelled timers are dropped lazily when they reach the top of the heap.
+
+        When path is set every change is appended to a JSON lines journal and
+        pending timers are loaded from it on start, so they survive restarts.
+        Timers that were firing when the process stopped are fired again.
+
+        Parameters:
+            - path: The path of the journal file, or None to keep timers in memory only.
+            - batch_window: Seconds by which timers due close together are fired together.
+        """
+        self.path = path
+        self.batch_window = batch_window
+        self.heap = []
+        self.timers = {}
+        self.journal = None
+        self.journal_lines = 0
+        self.wakeup = None
+        self.task = None
+        self.handler = None
+        self.running_jobs = set()
+        if path is not None:
+            self._load()
+
+    def pending(self):
+        """
+        Returns the number of pending timers.
+
+        Returns:
+            - pending: The number of timers not yet fired or cancelled.
+        """
+        return len(self.timers)
+
+    def add(self, at, action, args):
+        """
+        Adds a timer.
+
+        Parameters:
+            - at: Unix timestamp at which the timer fires.
+            - action: The action name passed to the handler.
+            - args: A JSON serializable dictionary passed to the handler.
+
+        Returns:
+            - timer_id: The ID of the timer.
+        """
+        timer_id = uuid.uuid4().hex
+        self.timers[timer_id] = (at, action, args)
+        heapq.heappush(self.heap, (at, timer_id))
+        self._journal({"op": "add", "id": timer_id, "at": at, "action": action, "args": args})
+        if self.wakeup is not None and self.heap[0][1] == timer_id:
+            self.wakeup.set()
+        return timer_id
+
+    def cancel(self, timer_id):
+        """
+        Cancels a pending timer.
+
+        Parameters:
+            - timer_id: The ID of the timer.
+
+        Returns:
+            - True: If the timer was pending.
+            - False: If it already fired or does not exist.
+        """
+        if self.timers.pop(timer_id, None) is None:
+            return False
+        self._journal({"op": "done", "id": timer_id})
+        return True
+
+    def start(self, handler):
+        """
+        Starts firing timers on the running event loop.
+
+        Parameters:
+            - handler: A coroutine function called with (action, args) for each timer.
+
+        Returns:
+            - None
+        """
+        if self.task is not None:
+            return
+        self.handler = handler
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """
+        Stops firing timers and waits for the ones already firing.
+        Pending timers stay in the journal.
+
+        Returns:
+            - None
+        """
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        if self.running_jobs:
+            await asyncio.gather(*self.running_jobs, return_exceptions=True)
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    async def _run(self):
+        while True:
+            while self.heap and self.heap[0][1] not in self.timers:
+                heapq.heappop(self.heap)
+            if not self.heap:
+                await self._wait()
+                continue
+            delay = self.heap[0][0] - time.time()
+            if delay > 0:
+                await self._wait(delay)
+                continue
+
+            horizon = time.time() + self.batch_window
+            batch = []
+            while self.heap and self.heap[0][0] <= horizon:
+                _, timer_id = heapq.heappop(self.heap)
+                if timer_id in self.timers:
+                    batch.append(timer_id)
+            job = asyncio.ensure_future(self._fire(batch))
+            self.running_jobs.add(job)
+            job.add_done_callback(self.running_jobs.discard)
+
+    async def _wait(self, timeout=None):
+        self.wakeup.clear()
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _fire(self, batch):
+        # Timers cancelled between being taken off the heap and firing are skipped.
+        timers = [(timer_id, self.timers[timer_id]) for timer_id in batch if timer_id in self.timers]
+        results = await asyncio.gather(*(self.handler(action, args) for _, (_, action, args) in timers),
+                                       return_exceptions=True)
+        for (timer_id, (_, action, _)), result in zip(timers, results):
+            if isinstance(result, Exception):
+                print(f"Timer {timer_id} ({action}) failed: {result}")
+            if self.timers.pop(timer_id, None) is not None:
+                self._journal({"op": "done", "id": timer_id})
+
+    def _journal(self, entry):
+        if self.path is None:
+            return
+        if self.journal is None:
+            self.journal = open(self.path, "a")
+        self.journal.write(json.dumps(entry) + "\n")
+        self.journal.flush()
+        self.journal_lines += 1
+        if self.journal_lines > 2 * len(self.timers) + 1000:
+            self._compact()
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash, nothing after it was written.
+                        break
+                    if entry["op"] == "add":
+                        self.timers[entry["id"]] = (entry["at"], entry["action"], entry["args"])
+                    else:
+                        self.timers.pop(entry["id"], None)
+        self.heap = [(at, timer_id) for timer_id, (at, _, _) in self.timers.items()]
+        heapq.heapify(self.heap)
+        self._compact()
+
+    def _compact(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            for timer_id, (at, action, args) in self.timers.items():
+                f.write(json.dumps({"op": "add", "id": timer_id, "at": at, "action": action, "args": args}) + "\n")
+        os.replace(temp_path, self.path)
+        self.journal_lines = len(self.timers)
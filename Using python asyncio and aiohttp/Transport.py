@@ -0,0 +1,190 @@
+import asyncio
+import json
+import time
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        """
+        A fully read HTTP response, the same for every transport.
+
+        Parameters:
+            - status: HTTP status code.
+            - headers: The response headers.
+            - body: The response body as bytes.
+        """
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class AiohttpTransport:
+    def __init__(self, limit=100):
+        """
+        Sends requests over HTTP/1.1 with a pooled aiohttp.ClientSession.
+
+        Parameters:
+            - limit: Maximum number of simultaneous connections.
+        """
+        import aiohttp
+
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=limit))
+
+    async def request(self, method, url, **kwargs):
+        """
+        Sends a request and reads the whole response.
+
+        Parameters:
+            - method: The HTTP method.
+            - url: The request URL.
+            - kwargs: headers, data or json, as accepted by aiohttp.
+
+        Returns:
+            - response: A Response object.
+        """
+        async with self.session.request(method, url, **kwargs) as response:
+            return Response(response.status, response.headers, await response.read())
+
+    async def close(self):
+        await self.session.close()
+
+
+class Http2Transport:
+    def __init__(self, timeout=10, **client_options):
+        """
+        Sends requests over HTTP/2 with httpx, multiplexing all concurrent
+        requests to a host over a single connection.
+
+        Parameters:
+            - timeout: Request timeout in seconds.
+            - client_options: Extra keyword arguments for httpx.AsyncClient.
+        """
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError("Http2Transport requires httpx with HTTP/2 support: pip install 'httpx[http2]'")
+
+        self.client = httpx.AsyncClient(http2=True, timeout=timeout, **client_options)
+
+    async def request(self, method, url, data=None, json=None, headers=None):
+        """
+        Sends a request and reads the whole response.
+
+        Parameters:
+            - method: The HTTP method.
+            - url: The request URL.
+            - data: The raw request body.
+            - json: A JSON serializable request body.
+            - headers: The request headers.
+
+        Returns:
+            - response: A Response object.
+        """
+        response = await self.client.request(method, url, content=data, json=json, headers=headers)
+        return Response(response.status_code, response.headers, response.content)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class RecordingTransport:
+    def __init__(self, transport, path):
+        """
+        Wraps another transport and writes every request and response, with
+        the time it took, to a cassette file that ReplayTransport serves back.
+
+        The cassette holds response bodies as Discord returned them, which
+        include webhook tokens, so keep it as private as the bot token.
+
+        Parameters:
+            - transport: The transport that sends the requests.
+            - path: The path of the cassette, a JSON lines file that is overwritten.
+        """
+        self.transport = transport
+        self.cassette = open(path, "w")
+
+    async def request(self, method, url, **kwargs):
+        """
+        Sends a request through the wrapped transport and records it.
+
+        Parameters:
+            - method: The HTTP method.
+            - url: The request URL.
+            - kwargs: Passed on to the wrapped transport.
+
+        Returns:
+            - response: The Response of the wrapped transport.
+        """
+        started = time.perf_counter()
+        response = await self.transport.request(method, url, **kwargs)
+        latency = time.perf_counter() - started
+        entry = {
+            "method": method,
+            "url": url,
+            "status": response.status,
+            "headers": dict(response.headers),
+            "body": response.body.decode(),
+            "latency": latency
+        }
+        self.cassette.write(json.dumps(entry) + "\n")
+        self.cassette.flush()
+        return response
+
+    async def close(self):
+        await self.transport.close()
+        self.cassette.close()
+
+
+class ReplayTransport:
+    def __init__(self, path, scale=1.0, loop=False):
+        """
+        Serves the responses of a cassette written by RecordingTransport, so
+        DiscordIntegration can be tested offline and repeatably.
+
+        Requests are matched by method and URL. Repeated requests get the
+        recorded responses in the order they were recorded, each after its
+        recorded latency multiplied by scale.
+
+        Parameters:
+            - path: The path of the cassette.
+            - scale: Factor applied to recorded latencies, 0 to answer at once.
+            - loop: Whether to start over once the responses for a request run out.
+        """
+        self.scale = scale
+        self.loop = loop
+        self.interactions = {}
+        self.positions = {}
+        with open(path) as f:
+            for line in f:
+                entry = json.loads(line)
+                self.interactions.setdefault((entry["method"], entry["url"]), []).append(entry)
+
+    async def request(self, method, url, **kwargs):
+        """
+        Replays the next recorded response for a request.
+
+        Parameters:
+            - method: The HTTP method.
+            - url: The request URL.
+            - kwargs: Ignored, requests are matched by method and URL only.
+
+        Returns:
+            - response: A Response object.
+        """
+        from multidict import CIMultiDict
+
+        key = (method, url)
+        recorded = self.interactions.get(key, [])
+        position = self.positions.get(key, 0)
+        if not recorded or (position >= len(recorded) and not self.loop):
+            raise LookupError(f"No recorded response left for {method} {url}")
+        entry = recorded[position % len(recorded)]
+        self.positions[key] = position + 1
+        await asyncio.sleep(entry["latency"] * self.scale)
+        return Response(entry["status"], CIMultiDict(entry["headers"]), entry["body"].encode())
+
+    async def close(self):
+        pass
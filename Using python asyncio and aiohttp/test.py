@@ -1,13 +1,39 @@
 import unittest
 import asyncio
+import gzip
+import json
+import os
+import tempfile
+import time
 import warnings
-from DiscordIntegration import DiscordIntegration
+from unittest.mock import patch
+from ChannelExporter import ChannelExporter
+from ConcurrencyLimiter import ConcurrencyLimiter
+from DiscordDaemon import DiscordDaemon
+from DiscordIntegration import PENDING, DiscordIntegration
+from MessageDeduplicator import MessageDeduplicator
+from MessageIndex import MessageIndex
+from PriorityScheduler import PriorityScheduler, RateLimitBucket
+from RateLimitStore import FileRateLimitStore, RedisRateLimitStore
+from TimerScheduler import TimerScheduler
+from Transport import AiohttpTransport, RecordingTransport, ReplayTransport, Response
 
 
 class TestDiscordIntegration(unittest.IsolatedAsyncioTestCase):
 
     async def asyncSetUp(self):
-        self.discord_int = DiscordIntegration({"token": "YOUR BOT TOKEN", "channel_id": "YOUR CHANNEL ID"})
+        # With DISCORD_CASSETTES set, each test replays its requests from a cassette in that
+        # directory, or records one against Discord when DISCORD_RECORD=1 is set as well.
+        transport = None
+        cassettes = os.environ.get("DISCORD_CASSETTES")
+        if cassettes:
+            path = os.path.join(cassettes, f"{self.id()}.jsonl")
+            if os.environ.get("DISCORD_RECORD") == "1":
+                transport = RecordingTransport(AiohttpTransport(), path)
+            else:
+                transport = ReplayTransport(path, scale=0)
+
+        self.discord_int = DiscordIntegration({"token": "YOUR BOT TOKEN", "channel_id": "YOUR CHANNEL ID"}, transport=transport)
 
         webhooks = await self.discord_int.get_all_webhooks()
         if webhooks is not None:
@@ -96,6 +122,575 @@ class TestDiscordIntegration(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(delete_status, 204)
 
 
+class BrokenStore:
+
+    def __init__(self):
+        self.calls = 0
+
+    async def reserve(self, key):
+        self.calls += 1
+        raise ConnectionError("store is down")
+
+    async def update(self, key, remaining, reset_after):
+        self.calls += 1
+        raise ConnectionError("store is down")
+
+
+class TestPriorityScheduler(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.bucket = RateLimitBucket()
+        self.order = []
+
+    async def record(self, lane):
+        self.order.append(lane)
+
+    async def test_weighted_lanes(self):
+        scheduler = PriorityScheduler()
+        futures = [scheduler.submit("bulk", self.bucket, self.record, "bulk") for _ in range(8)]
+        futures += [scheduler.submit("critical", self.bucket, self.record, "critical") for _ in range(8)]
+        scheduler.start()
+        await asyncio.gather(*futures)
+        await scheduler.stop()
+        self.assertEqual(self.order[:9].count("critical"), 8)
+
+    async def test_drop_lowest_lane_on_overflow(self):
+        scheduler = PriorityScheduler(max_backlog=1)
+        scheduler.submit("normal", self.bucket, self.record, "normal")
+        future = scheduler.submit("bulk", self.bucket, self.record, "bulk")
+        self.assertIsNone(await future)
+        self.assertEqual(scheduler.dropped, 1)
+        self.assertEqual(scheduler.backlog(), {"critical": 0, "normal": 1, "bulk": 0})
+
+    async def test_sample_lowest_lane_on_overflow(self):
+        scheduler = PriorityScheduler(max_backlog=0, overflow_policy="sample", sample_every=2)
+        for _ in range(4):
+            scheduler.submit("bulk", self.bucket, self.record, "bulk")
+        self.assertEqual(scheduler.dropped, 2)
+        self.assertEqual(scheduler.backlog()["bulk"], 2)
+
+    async def test_rate_limit_bucket(self):
+        self.assertEqual(await self.bucket.reserve(), 0)
+        await self.bucket.update(429, {"Retry-After": "60"})
+        self.assertGreater(await self.bucket.reserve(), 0)
+
+    async def test_limiter_bounds_running_jobs(self):
+        scheduler = PriorityScheduler(limiter=ConcurrencyLimiter(initial_limit=2, max_limit=2))
+        running = []
+        peak = []
+
+        async def job():
+            running.append(1)
+            peak.append(len(running))
+            await asyncio.sleep(0.02)
+            running.pop()
+
+        scheduler.start()
+        await asyncio.gather(*(scheduler.submit("normal", self.bucket, job) for _ in range(8)))
+        await scheduler.stop()
+        self.assertEqual(max(peak), 2)
+
+    async def test_throttled_bucket_does_not_block_others(self):
+        scheduler = PriorityScheduler()
+        throttled = RateLimitBucket("a")
+        await throttled.update(429, {"Retry-After": "2"})
+        free = RateLimitBucket("b")
+
+        async def now():
+            return time.monotonic()
+
+        scheduler.start()
+        waiting = scheduler.submit("normal", throttled, now)
+        started = time.monotonic()
+        finished = await scheduler.submit("normal", free, now)
+        self.assertLess(finished - started, 0.5)
+        self.assertFalse(waiting.done())
+        self.assertGreaterEqual(await waiting - started, 1.5)
+        await scheduler.stop()
+
+    async def test_store_failure_does_not_stop_dispatcher(self):
+        store = BrokenStore()
+        scheduler = PriorityScheduler()
+        scheduler.start()
+        bucket = RateLimitBucket("a", store)
+        await asyncio.wait_for(scheduler.submit("normal", bucket, self.record, "first"), 1)
+        await asyncio.wait_for(scheduler.submit("normal", bucket, self.record, "second"), 1)
+        await scheduler.stop()
+        self.assertEqual(self.order, ["first", "second"])
+        # The second job went out without trying the store again.
+        self.assertEqual(store.calls, 1)
+
+
+class TestConcurrencyLimiter(unittest.TestCase):
+
+    def test_additive_increase(self):
+        limiter = ConcurrencyLimiter(initial_limit=2)
+        self.assertTrue(limiter.try_acquire())
+        limiter.observe(0.1)
+        self.assertEqual(limiter.limit, 2)
+        self.assertTrue(limiter.try_acquire())
+        self.assertFalse(limiter.try_acquire())
+        for _ in range(4):
+            limiter.observe(0.1)
+        # Grows to 3, then stops since only 2 requests are in flight.
+        self.assertEqual(limiter.metrics()["limit"], 3)
+
+    def test_multiplicative_decrease(self):
+        limiter = ConcurrencyLimiter(initial_limit=16)
+        limiter.observe(0.1)
+        limiter.observe(0.1, throttled=True)
+        self.assertEqual(limiter.limit, 8)
+        # Responses to requests sent before the back-off saw the same congestion.
+        limiter.observe(0.5)
+        self.assertEqual(limiter.limit, 8)
+        time.sleep(0.01)
+        limiter.observe(0.001, throttled=True)
+        self.assertEqual(limiter.limit, 4)
+        self.assertEqual(limiter.metrics()["decreases"], 2)
+
+
+async def fake_redis(reader, writer, data):
+    # Local stand-in for the handful of Redis commands RedisRateLimitStore uses
+    while True:
+        line = await reader.readline()
+        if not line:
+            writer.close()
+            return
+        args = []
+        for _ in range(int(line[1:])):
+            length = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(length + 2))[:-2].decode())
+        command, key = args[0].upper(), args[1]
+        value, expires_at = data.get(key, (None, None))
+        if expires_at is not None and time.time() >= expires_at:
+            value, expires_at = None, None
+            data.pop(key, None)
+        if command == "GET":
+            writer.write(b"$-1\r\n" if value is None else f"${len(value)}\r\n{value}\r\n".encode())
+        elif command == "SET":
+            data[key] = (args[2], time.time() + int(args[4]) / 1000)
+            writer.write(b"+OK\r\n")
+        elif command == "DECR":
+            value = int(value or 0) - 1
+            data[key] = (str(value), expires_at)
+            writer.write(f":{value}\r\n".encode())
+        elif command == "PTTL":
+            ttl = -1 if expires_at is None else int((expires_at - time.time()) * 1000)
+            writer.write(f":{ttl if value is not None else -2}\r\n".encode())
+        elif command == "DEL":
+            writer.write(f":{int(data.pop(key, None) is not None)}\r\n".encode())
+        await writer.drain()
+
+
+class TestRateLimitStore(unittest.IsolatedAsyncioTestCase):
+
+    async def assertSharedBudget(self, first, second):
+        await first.update("webhook", 2, 60)
+        self.assertEqual(await first.reserve("webhook"), 0)
+        self.assertEqual(await second.reserve("webhook"), 0)
+        self.assertGreater(await first.reserve("webhook"), 0)
+        self.assertGreater(await second.reserve("webhook"), 0)
+        self.assertEqual(await second.reserve("other"), 0)
+
+    async def test_file_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "ratelimit.json")
+            await self.assertSharedBudget(FileRateLimitStore(path), FileRateLimitStore(path))
+
+    async def test_redis_store(self):
+        data = {}
+        server = await asyncio.start_server(lambda r, w: fake_redis(r, w, data), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        first = RedisRateLimitStore(port=port)
+        second = RedisRateLimitStore(port=port)
+        try:
+            await self.assertSharedBudget(first, second)
+        finally:
+            await first.close()
+            await second.close()
+            server.close()
+            await server.wait_closed()
+
+
+class FakeDiscordIntegration:
+
+    def __init__(self):
+        self.scheduler = PriorityScheduler()
+        self.sent = []
+
+    async def send_message(self, message, image_url=None, priority="normal", webhook_url=None):
+        self.sent.append((message, priority, webhook_url))
+        return str(len(self.sent))
+
+
+class TestDiscordDaemon(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.discord_int = FakeDiscordIntegration()
+        self.daemon = DiscordDaemon(self.discord_int, {"alerts": "https://alerts", "logs": "https://logs"},
+                                    default_route="logs", batch_interval=0.05)
+
+    async def test_batches_per_route(self):
+        self.daemon.handle_line('{"content": "first"}')
+        self.daemon.handle_line(b'{"content": "second"}')
+        self.daemon.handle_line('{"route": "alerts", "content": "down", "priority": "critical"}')
+        await self.daemon.drain()
+        self.assertIn(("first\nsecond", "normal", "https://logs"), self.discord_int.sent)
+        self.assertIn(("down", "critical", "https://alerts"), self.discord_int.sent)
+        self.assertEqual(self.daemon.stats["sent"], 3)
+        self.assertEqual(self.daemon.stats["batches"], 2)
+
+    async def test_splits_long_messages(self):
+        self.daemon.handle_line(json.dumps({"content": "x" * 2500}))
+        await self.daemon.drain()
+        self.assertEqual([len(sent[0]) for sent in self.discord_int.sent], [2000, 500])
+
+    async def test_commands_and_invalid_lines(self):
+        self.assertIsNone(self.daemon.handle_line("not json"))
+        self.assertIsNone(self.daemon.handle_line('{"route": "missing", "content": "x"}'))
+        self.assertEqual(self.daemon.handle_line('{"command": "health"}')["status"], "ok")
+        stats = self.daemon.handle_line('{"command": "stats"}')
+        self.assertEqual(stats["invalid"], 2)
+        self.assertEqual(stats["received"], 0)
+
+    async def test_rejects_fields_that_are_not_strings(self):
+        for line in ('{"content": 5}', '{"content": ["x"]}', '{"route": ["logs"], "content": "x"}',
+                     '{"priority": {"lane": "bulk"}, "content": "x"}'):
+            self.assertIsNone(self.daemon.handle_line(line))
+        await self.daemon.drain()
+        self.assertEqual(self.daemon.stats["invalid"], 4)
+        self.assertEqual(self.discord_int.sent, [])
+
+    async def test_stdin_redirected_from_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "messages.jsonl")
+            with open(path, "w") as f:
+                f.write('{"content": "first"}\n{"content": "second"}\n')
+            with open(path) as stdin, patch("sys.stdin", stdin):
+                await asyncio.wait_for(self.daemon.serve(stdin=True), 5)
+        self.assertEqual(self.discord_int.sent, [("first\nsecond", "normal", "https://logs")])
+
+    async def test_unix_socket(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "discord.sock")
+            serve = asyncio.ensure_future(self.daemon.serve(unix_socket=path))
+            while not os.path.exists(path):
+                await asyncio.sleep(0.01)
+            reader, writer = await asyncio.open_unix_connection(path)
+            writer.write(b'{"content": "over the socket"}\n{"command": "stats"}\n')
+            stats = json.loads(await reader.readline())
+            writer.close()
+            self.daemon.stop()
+            await serve
+        self.assertEqual(stats["received"], 1)
+        self.assertEqual(self.discord_int.sent, [("over the socket", "normal", "https://logs")])
+
+
+class TestMessageDeduplicator(unittest.TestCase):
+
+    def test_collapses_repeats(self):
+        deduplicator = MessageDeduplicator()
+        self.assertIsNone(deduplicator.claim("disk full", None, "https://webhook"))
+        deduplicator.sent("disk full", None, "https://webhook", "1")
+        for _ in range(2):
+            self.assertEqual(deduplicator.claim("disk full", None, "https://webhook").message_id, "1")
+        self.assertIsNone(deduplicator.claim("disk full", None, "https://other"))
+        self.assertEqual(deduplicator.due_edits(), [])
+        edits = deduplicator.due_edits(force=True)
+        self.assertEqual([(edit.message_id, edit.text()) for edit in edits], [("1", "disk full\n(repeated 3 times)")])
+        self.assertEqual(deduplicator.due_edits(force=True), [])
+
+    def test_window_expiry_reports_pending_count(self):
+        deduplicator = MessageDeduplicator(window=0)
+        deduplicator.claim("disk full", None, "https://webhook")
+        deduplicator.sent("disk full", None, "https://webhook", "1")
+        deduplicator.entries[next(iter(deduplicator.entries))].count = 2
+        self.assertIsNone(deduplicator.claim("disk full", None, "https://webhook"))
+        self.assertEqual([edit.message_id for edit in deduplicator.due_edits()], ["1"])
+
+    def test_failed_send_is_not_suppressed(self):
+        deduplicator = MessageDeduplicator()
+        deduplicator.claim("disk full", None, "https://webhook")
+        deduplicator.sent("disk full", None, "https://webhook", None)
+        self.assertIsNone(deduplicator.claim("disk full", None, "https://webhook"))
+
+    def test_index_is_bounded(self):
+        deduplicator = MessageDeduplicator(max_entries=2)
+        for i in range(5):
+            deduplicator.claim(f"message {i}", None, "https://webhook")
+        self.assertEqual(len(deduplicator.entries), 2)
+
+
+class FakeTransport:
+
+    def __init__(self, statuses=None):
+        self.statuses = statuses or {}
+        self.requests = []
+        self.closed = False
+
+    async def request(self, method, url, **kwargs):
+        self.requests.append((method, url))
+        return Response(self.statuses.get(method, 200), {}, b'{"id": "42"}')
+
+    async def close(self):
+        self.closed = True
+
+
+class TestTransport(unittest.IsolatedAsyncioTestCase):
+
+    async def test_custom_transport(self):
+        transport = FakeTransport()
+        discord_int = DiscordIntegration({"token": "token", "channel_id": "1"}, transport=transport)
+        discord_int.use_webhook("https://discord.com/api/webhooks/1/token")
+        self.assertEqual(await discord_int.send_message("Hello"), "42")
+        self.assertEqual(await discord_int.edit_message("42", "Edited"), 200)
+        await discord_int.close_session()
+        self.assertEqual(transport.requests, [("POST", "https://discord.com/api/webhooks/1/token?wait=true"),
+                                              ("PATCH", "https://discord.com/api/webhooks/1/token/messages/42")])
+        self.assertTrue(transport.closed)
+
+    async def test_store_failure_after_sending_returns_response(self):
+        transport = FakeTransport()
+        discord_int = DiscordIntegration({"token": "token", "channel_id": "1"}, rate_limit_store=BrokenStore(), transport=transport)
+        discord_int.use_webhook("https://discord.com/api/webhooks/1/token")
+        self.assertEqual(await discord_int.send_message("Hello"), "42")
+        await discord_int.close_session()
+        self.assertEqual(len(transport.requests), 1)
+
+    async def test_repeats_are_edited_in_the_background(self):
+        transport = FakeTransport()
+        deduplicator = MessageDeduplicator(edit_interval=0.05)
+        discord_int = DiscordIntegration({"token": "token", "channel_id": "1"}, deduplicator=deduplicator, transport=transport)
+        discord_int.use_webhook("https://discord.com/api/webhooks/1/token")
+        self.assertEqual(await discord_int.send_message("disk full"), "42")
+        self.assertEqual(await discord_int.send_message("disk full"), "42")
+        self.assertEqual([method for method, _ in transport.requests], ["POST"])
+        await asyncio.sleep(0.2)
+        await discord_int.close_session()
+        self.assertEqual([method for method, _ in transport.requests], ["POST", "PATCH"])
+
+    async def test_warmup(self):
+        transport = FakeTransport()
+        discord_int = DiscordIntegration({"token": "token", "channel_id": "1"}, transport=transport)
+        discord_int.use_webhook("http://localhost/api/webhooks/1/token")
+        self.assertEqual(await discord_int.warmup(connections=3), {"id": "42"})
+        self.assertEqual(discord_int.webhook_info, {"id": "42"})
+        self.assertEqual(transport.requests, [("GET", "http://localhost/api/webhooks/1/token")] * 3)
+        await discord_int.close_session()
+
+    async def test_send_ephemeral(self):
+        transport = FakeTransport()
+        discord_int = DiscordIntegration({"token": "token", "channel_id": "1"}, transport=transport)
+        discord_int.use_webhook("https://discord.com/api/webhooks/1/token")
+        self.assertEqual(await discord_int.send_ephemeral("Goes away", ttl=0.05), "42")
+        await asyncio.sleep(0.2)
+        await discord_int.close_session()
+        self.assertEqual(transport.requests[-1], ("DELETE", "https://discord.com/api/webhooks/1/token/messages/42"))
+
+    async def test_upsert_message(self):
+        transport = FakeTransport()
+        discord_int = DiscordIntegration({"token": "token", "channel_id": "1"}, transport=transport)
+        discord_int.use_webhook("https://discord.com/api/webhooks/1/token")
+        self.assertEqual(await discord_int.upsert_message("deploy", "Deploying"), "42")
+        self.assertEqual(await discord_int.upsert_message("deploy", "Deployed"), "42")
+        transport.statuses["PATCH"] = 404
+        self.assertEqual(await discord_int.upsert_message("deploy", "Deployed again"), "42")
+        await discord_int.close_session()
+        self.assertEqual([method for method, _ in transport.requests], ["POST", "PATCH", "PATCH", "POST"])
+
+    async def test_concurrent_upserts_post_once(self):
+        transport = FakeTransport()
+        discord_int = DiscordIntegration({"token": "token", "channel_id": "1"}, transport=transport)
+        discord_int.use_webhook("https://discord.com/api/webhooks/1/token")
+        results = await asyncio.gather(*(discord_int.upsert_message("deploy", f"Step {n}") for n in range(3)))
+        await discord_int.close_session()
+        self.assertEqual(results, ["42"] * 3)
+        self.assertEqual([method for method, _ in transport.requests], ["POST", "PATCH", "PATCH"])
+
+    async def test_repeat_of_message_in_flight(self):
+        transport = FakeTransport()
+        deduplicator = MessageDeduplicator()
+        discord_int = DiscordIntegration({"token": "token", "channel_id": "1"}, deduplicator=deduplicator, transport=transport)
+        discord_int.use_webhook("https://discord.com/api/webhooks/1/token")
+        # As if another caller's POST of the first copy had not returned yet.
+        deduplicator.claim("disk full", None, discord_int.webhook_url)
+        self.assertEqual(await discord_int.send_message("disk full"), PENDING)
+        await discord_int.close_session()
+        self.assertEqual(transport.requests, [])
+
+    async def test_upsert_is_not_deduplicated(self):
+        transport = FakeTransport()
+        discord_int = DiscordIntegration({"token": "token", "channel_id": "1"}, deduplicator=MessageDeduplicator(), transport=transport)
+        discord_int.use_webhook("https://discord.com/api/webhooks/1/token")
+        await discord_int.upsert_message("api", "Healthy")
+        await discord_int.upsert_message("worker", "Healthy")
+        await discord_int.close_session()
+        self.assertEqual([method for method, _ in transport.requests], ["POST", "POST"])
+
+    async def test_record_and_replay(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cassette.jsonl")
+            transport = RecordingTransport(FakeTransport(statuses={"DELETE": 204}), path)
+            discord_int = DiscordIntegration({"token": "token", "channel_id": "1"}, transport=transport)
+            discord_int.use_webhook("https://discord.com/api/webhooks/1/token")
+            recorded = [await discord_int.send_message("Hello"), await discord_int.delete_message("42")]
+            await discord_int.close_session()
+
+            transport = ReplayTransport(path, scale=0)
+            discord_int = DiscordIntegration({"token": "token", "channel_id": "1"}, transport=transport)
+            discord_int.use_webhook("https://discord.com/api/webhooks/1/token")
+            self.assertEqual([await discord_int.send_message("Hello"), await discord_int.delete_message("42")], recorded)
+            with self.assertRaises(LookupError):
+                await discord_int.send_message("Hello")
+            await discord_int.close_session()
+
+    async def test_replay_scales_latency(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cassette.jsonl")
+            with open(path, "w") as f:
+                f.write(json.dumps({"method": "GET", "url": "https://discord.com/api/v9/webhooks/1", "status": 200,
+                                    "headers": {"X-RateLimit-Remaining": "4"}, "body": "{}", "latency": 0.2}) + "\n")
+            transport = ReplayTransport(path, scale=0.25, loop=True)
+            for _ in range(2):
+                started = time.perf_counter()
+                response = await transport.request("GET", "https://discord.com/api/v9/webhooks/1")
+                self.assertAlmostEqual(time.perf_counter() - started, 0.05, delta=0.04)
+            self.assertEqual(response.headers["X-RateLimit-Remaining"], "4")
+
+
+class TestMessageIndex(unittest.TestCase):
+
+    def test_persists_keys(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "messages.db")
+            index = MessageIndex(path)
+            index.set("webhook", "deploy", "1")
+            index.set("webhook", "deploy", "2")
+            index.set("other", "deploy", "3")
+            index.close()
+            index = MessageIndex(path)
+            self.assertEqual(index.get("webhook", "deploy"), "2")
+            self.assertEqual(index.get("other", "deploy"), "3")
+            self.assertEqual(index.count, 2)
+            index.delete("webhook", "deploy")
+            self.assertIsNone(index.get("webhook", "deploy"))
+            index.close()
+
+    def test_evicts_least_recently_updated(self):
+        index = MessageIndex(max_entries=2)
+        for i in range(3):
+            index.set("webhook", f"key {i}", str(i))
+        self.assertIsNone(index.get("webhook", "key 0"))
+        self.assertEqual(index.get("webhook", "key 2"), "2")
+        self.assertEqual(index.count, 2)
+
+
+class TestTimerScheduler(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.fired = []
+
+    async def record(self, action, args):
+        self.fired.append((action, args["n"]))
+
+    async def test_fires_in_order_and_cancels(self):
+        timers = TimerScheduler()
+        now = time.time()
+        timers.add(now + 0.1, "send", {"n": 2})
+        timers.add(now + 0.05, "send", {"n": 1})
+        cancelled = timers.add(now + 0.05, "delete", {"n": 3})
+        self.assertTrue(timers.cancel(cancelled))
+        self.assertFalse(timers.cancel(cancelled))
+        timers.start(self.record)
+        await asyncio.sleep(0.3)
+        await timers.stop()
+        self.assertEqual(self.fired, [("send", 1), ("send", 2)])
+        self.assertEqual(timers.pending(), 0)
+
+    async def test_cancel_while_batch_is_starting(self):
+        timers = TimerScheduler()
+        now = time.time()
+        timer_ids = [timers.add(now, "send", {"n": n}) for n in range(3)]
+        timers.start(self.record)
+        # Lets the scheduler take the batch off the heap, but not fire it yet.
+        await asyncio.sleep(0)
+        self.assertTrue(timers.cancel(timer_ids[1]))
+        await asyncio.sleep(0.1)
+        await timers.stop()
+        self.assertCountEqual(self.fired, [("send", 0), ("send", 2)])
+        self.assertEqual(timers.pending(), 0)
+
+    async def test_batches_due_timers(self):
+        timers = TimerScheduler(batch_window=1)
+        now = time.time()
+        for n in range(100):
+            timers.add(now + n / 1000, "delete", {"n": n})
+        timers.start(self.record)
+        await asyncio.sleep(0.1)
+        await timers.stop()
+        self.assertEqual(len(self.fired), 100)
+
+    async def test_pending_timers_survive_restart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "timers.jsonl")
+            timers = TimerScheduler(path)
+            fired = timers.add(time.time(), "delete", {"n": 1})
+            timers.add(time.time() + 3600, "delete", {"n": 2})
+            timers.start(self.record)
+            await asyncio.sleep(0.1)
+            await timers.stop()
+
+            restored = TimerScheduler(path)
+            self.assertEqual(restored.pending(), 1)
+            self.assertNotIn(fired, restored.timers)
+
+
+class FakeChannel:
+
+    def __init__(self, count, fail_after=None, failure=403):
+        self.messages = [{"id": str(1000 + i), "content": f"message {i}"} for i in range(count)]
+        self.fail_after = fail_after
+        self.failure = failure
+        self.requests = 0
+
+    async def get_messages(self, after="0", limit=100, channel_id=None):
+        self.requests += 1
+        if self.fail_after is not None and self.requests > self.fail_after:
+            if isinstance(self.failure, Exception):
+                raise self.failure
+            return self.failure
+        return [message for message in self.messages if int(message["id"]) > int(after)][:limit]
+
+
+class TestChannelExporter(unittest.IsolatedAsyncioTestCase):
+
+    async def test_export_and_resume(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "channel.jsonl.gz")
+            channel = FakeChannel(450, fail_after=2)
+            exporter = ChannelExporter(channel, path, pages_per_checkpoint=1)
+            self.assertEqual(await exporter.export(), 200)
+            self.assertEqual(exporter.error, 403)
+            self.assertEqual(ChannelExporter(channel, path).checkpoint()["last_id"], "1199")
+            with open(path, "ab") as f:
+                # An interrupted batch after the checkpoint.
+                f.write(b"partial")
+
+            channel.fail_after = None
+            self.assertEqual(await ChannelExporter(channel, path, pages_per_checkpoint=1).export(), 250)
+            with gzip.open(path) as f:
+                ids = [json.loads(line)["id"] for line in f]
+            self.assertEqual(ids, [message["id"] for message in channel.messages])
+
+    async def test_fetch_exception_is_raised(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "channel.jsonl.gz")
+            channel = FakeChannel(450, fail_after=1, failure=ConnectionError("connection reset"))
+            with self.assertRaises(ConnectionError):
+                await ChannelExporter(channel, path).export()
+            self.assertEqual(ChannelExporter(channel, path).checkpoint()["last_id"], "1099")
+
+
 if __name__ == "__main__":
     try:
         asyncio.run(unittest.main())
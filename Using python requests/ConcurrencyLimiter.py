@@ -0,0 +1,102 @@
+import threading
+import time
+
+
+class ConcurrencyLimiter:
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=64, backoff=0.5, latency_tolerance=2.0, smoothing=0.1):
+        """
+        Initializes the ConcurrencyLimiter object.
+
+        Limits the number of requests in flight with additive increase,
+        multiplicative decrease. While the limit is fully used and latency
+        stays within latency_tolerance times its moving average, every
+        response adds 1/limit, so the limit grows by about one per round trip.
+        A 429 or a latency spike multiplies it by backoff, at most once per
+        round trip since the requests already in flight saw the same congestion.
+
+        Parameters:
+            - initial_limit: The starting number of requests in flight.
+            - min_limit: The lowest the limit backs off to.
+            - max_limit: The highest the limit grows to.
+            - backoff: Factor the limit is multiplied by on a 429 or latency spike.
+            - latency_tolerance: Multiple of the average latency that counts as a spike.
+            - smoothing: Weight of each response in the moving average latency.
+        """
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self.in_flight = 0
+        self.latency = None
+        self.last_decrease = 0
+        self.decreases = 0
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        """
+        Takes a slot if fewer requests than the limit are in flight.
+
+        Returns:
+            - True: If a slot was taken.
+            - False: If the limit is reached.
+        """
+        with self.lock:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        """
+        Gives back a slot taken with try_acquire.
+
+        Returns:
+            - None
+        """
+        with self.lock:
+            self.in_flight -= 1
+
+    def observe(self, latency, throttled=False):
+        """
+        Adjusts the limit from a completed request.
+
+        Parameters:
+            - latency: Seconds the request took.
+            - throttled: Whether Discord answered with a 429.
+
+        Returns:
+            - None
+        """
+        with self.lock:
+            now = time.monotonic()
+            spike = self.latency is not None and latency > self.latency * self.latency_tolerance
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self.smoothing * (latency - self.latency)
+
+            if throttled or spike:
+                if now - latency >= self.last_decrease:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self.last_decrease = now
+                    self.decreases += 1
+            elif self.in_flight >= int(self.limit):
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def metrics(self):
+        """
+        Returns the current state of the limiter.
+
+        Returns:
+            - metrics: A dictionary with the current limit, requests in flight,
+              average latency in seconds and number of back-offs so far.
+        """
+        with self.lock:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "latency": self.latency,
+                "decreases": self.decreases
+            }
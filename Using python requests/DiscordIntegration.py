@@ -1,24 +1,111 @@
-import requests
 import json
+import socket
+import threading
+import time
 from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+if __package__:
+    from .ConcurrencyLimiter import ConcurrencyLimiter
+    from .PriorityScheduler import PriorityScheduler, RateLimitBucket
+    from .RateLimitStore import MemoryRateLimitStore
+    from .Transport import RequestsTransport
+else:
+    from ConcurrencyLimiter import ConcurrencyLimiter
+    from PriorityScheduler import PriorityScheduler, RateLimitBucket
+    from RateLimitStore import MemoryRateLimitStore
+    from Transport import RequestsTransport
+
+
+# Returned by send_message for a suppressed repeat whose first copy is still
+# being sent and has no ID yet. Like an ID, it is a string, so callers that
+# check for one count the repeat as delivered.
+PENDING = "pending"
 
 
 class DiscordIntegration:
-    def __init__(self, secrets):
+    def __init__(self, secrets, scheduler=None, rate_limit_store=None, deduplicator=None, message_index=None, transport=None, limiter=None):
         """
         Initializes the DiscordIntegration object.
 
         Parameters:
             - secrets: A dictionary containing the required keys (token, channel_id).
+            - scheduler: A PriorityScheduler for outbound webhook requests.
+            - rate_limit_store: The store that holds rate-limit state, shared with
+              other processes when a FileRateLimitStore or RedisRateLimitStore is used.
+            - deduplicator: A MessageDeduplicator that collapses repeated messages. A background
+              thread edits the repeat counts in every edit_interval seconds.
+            - message_index: A MessageIndex mapping upsert_message keys to message IDs,
+              in memory unless given a database path.
+            - transport: The HTTP transport, RequestsTransport by default or Http2Transport
+              to multiplex concurrent requests over one HTTP/2 connection.
+            - limiter: The ConcurrencyLimiter that adapts how many webhook requests run at once
+              to Discord's latency and 429s. Its current limit is in limiter.metrics().
         """
         self.token = secrets["token"]
         self.channel_id = secrets["channel_id"]
         self.webhook_url = None
         self.webhook_id = None
-        self.executor = ThreadPoolExecutor(max_workers=10)
+        self.webhook_info = None
+        self.limiter = limiter or ConcurrencyLimiter()
+        self.executor = ThreadPoolExecutor(max_workers=self.limiter.max_limit)
+        self.transport = transport or RequestsTransport()
+        self.scheduler = scheduler or PriorityScheduler(limiter=self.limiter)
+        self.rate_limit_store = rate_limit_store or MemoryRateLimitStore()
+        self.rate_limits = {}
+        self.deduplicator = deduplicator
+        self.message_index = message_index
+        self.upsert_lock = threading.Lock()
+        self.upsert_locks = {}
+        self.flush_stop = threading.Event()
+        self.flush_thread = None
+        if deduplicator is not None:
+            self.flush_thread = threading.Thread(target=self._flush_repeats_periodically, name="discord-repeat-flush", daemon=True)
+            self.flush_thread.start()
 
     def close_executor(self):
+        self.flush_stop.set()
+        if self.flush_thread is not None:
+            self.flush_thread.join()
+        self.scheduler.stop()
         self.executor.shutdown()
+        self.transport.close()
+        if self.message_index is not None:
+            self.message_index.close()
+
+    def _rate_limit(self, webhook_id):
+        if webhook_id not in self.rate_limits:
+            self.rate_limits[webhook_id] = RateLimitBucket(webhook_id, self.rate_limit_store)
+        return self.rate_limits[webhook_id]
+
+    def _schedule(self, priority, webhook_id, method, url, **kwargs):
+        """
+        Runs a webhook request through the priority scheduler and waits for it.
+
+        Parameters:
+            - priority: The scheduler lane, e.g. "critical", "normal" or "bulk".
+            - webhook_id: The id of the webhook whose rate limit the request counts against.
+            - method: The HTTP method.
+            - url: The request URL.
+
+        Returns:
+            - response: The response object.
+            - None: If the request was shed by the scheduler.
+        """
+        self.scheduler.start(self.executor)
+        bucket = self._rate_limit(webhook_id)
+        future = self.scheduler.submit(priority, bucket, self._webhook_request, bucket, method, url, **kwargs)
+        return future.result()
+
+    def _webhook_request(self, bucket, method, url, **kwargs):
+        started = time.monotonic()
+        response = self.transport.request(method, url, **kwargs)
+        self.limiter.observe(time.monotonic() - started, response.status_code == 429)
+        try:
+            bucket.update(response.status_code, response.headers)
+        except Exception as e:
+            # The request already went out, so its response must reach the caller.
+            print(f"Failed to update rate limit budget for {bucket.key}: {e}")
+        return response
 
     def use_webhook(self, webhook_url):
         """
@@ -56,7 +143,7 @@ class DiscordIntegration:
             "name": webhook_name
         }
 
-        response = requests.post(url, headers=headers, data=json.dumps(data))
+        response = self.transport.request("POST", url, headers=headers, data=json.dumps(data))
         if response.status_code == 200:
             webhook_info = response.json()
             self.webhook_url = webhook_info['url']
@@ -91,12 +178,52 @@ class DiscordIntegration:
             "Authorization": f"Bot {self.token}"
         }
 
-        response = requests.get(url, headers=headers)
+        response = self.transport.request("GET", url, headers=headers)
         if response.status_code == 200:
             return response.json()
         else:
             return None
 
+    def warmup(self, connections=4):
+        """
+        Prepares the integration so the first message goes out on a hot connection.
+
+        Resolves the webhook host, starts the scheduler, and validates the current
+        webhook with `connections` parallel GET requests on the webhook URL, which
+        leaves that many keep-alive connections to the webhook host in the
+        transport pool. The webhook URL carries its own token, so no bot token is
+        needed. The webhook information is cached in webhook_info.
+
+        Parameters:
+            - connections: Number of connections to open.
+
+        Returns:
+            - webhook_info: The webhook information.
+            - None: If the webhook is not set or could not be validated.
+        """
+        if self.webhook_url is None or self.webhook_id is None:
+            print("Webhook URL or ID is not set. Use 'use_webhook' or 'create_webhook' first.")
+            return None
+
+        host = urlparse(self.webhook_url).hostname
+        try:
+            socket.getaddrinfo(host, 443, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            print(f"Failed to resolve {host}: {e}")
+
+        self.scheduler.start(self.executor)
+        results = list(self.executor.map(lambda _: self._validate_webhook(), range(connections)))
+        self.webhook_info = next((info for info in results if info is not None), None)
+        if self.webhook_info is None:
+            print("Webhook validation failed during warmup.")
+        return self.webhook_info
+
+    def _validate_webhook(self):
+        response = self.transport.request("GET", self.webhook_url)
+        if response.status_code == 200:
+            return response.json()
+        return None
+
     def get_all_webhooks(self):
         """
         Retrieves all webhooks in the specified Discord channel.
@@ -111,7 +238,7 @@ class DiscordIntegration:
             "Authorization": f"Bot {self.token}"
         }
 
-        response = requests.get(url, headers=headers)
+        response = self.transport.request("GET", url, headers=headers)
         if response.status_code == 200:
             webhooks = response.json()
             return [{"name": webhook["name"], "url": webhook["url"]} for webhook in webhooks]
@@ -147,7 +274,7 @@ class DiscordIntegration:
             "Authorization": f"Bot {self.token}",
             "Content-Type": "application/json"
         }
-        response = requests.patch(url, data=json.dumps(payload), headers=headers)
+        response = self.transport.request("PATCH", url, data=json.dumps(payload), headers=headers)
         return response.status_code
 
     def delete_webhook(self, webhook_url=None):
@@ -175,27 +302,48 @@ class DiscordIntegration:
             "Authorization": f"Bot {self.token}"
         }
 
-        response = requests.delete(url, headers=headers)
+        response = self.transport.request("DELETE", url, headers=headers)
         if webhook_url is None and self.webhook_url is not None:
             self.webhook_url = None
             self.webhook_id = None
         return response.status_code
 
-    def send_message(self, message, image_url=None):
+    def send_message(self, message, image_url=None, priority="normal", webhook_url=None, deduplicate=True):
         """
         Sends a message through the webhook.
 
         Parameters:
             - message: The message to be sent.
+            - priority: The scheduler lane to send the message in.
+            - webhook_url: The URL of the webhook to send through instead of the current one.
+            - deduplicate: Whether the deduplicator, if any, may collapse this message into an earlier copy.
 
         Returns:
-            - message_id: The ID of the sent message.
+            - message_id: The ID of the sent message, or of its first copy if it is
+              a repeat suppressed by the deduplicator.
+            - PENDING: If it is a repeat of a message that is still being sent.
             - response.status_code: If failed.
+            - None: If the message was shed by the scheduler.
         """
-        if self.webhook_url is None or self.webhook_id is None:
+        if webhook_url is None and (self.webhook_url is None or self.webhook_id is None):
             print("Webhook URL or ID is not set. Use 'use_webhook' or 'create_webhook' first.")
             return None
 
+        webhook_id = self.webhook_id
+        if webhook_url is not None:
+            url = webhook_url.split('/')
+            webhook_id = url[-2]
+        else:
+            webhook_url = self.webhook_url
+
+        deduplicate = deduplicate and self.deduplicator is not None
+        if deduplicate:
+            repeated = self.deduplicator.claim(message, image_url, webhook_url)
+            if repeated is not None:
+                if repeated.message_id is None:
+                    return PENDING
+                return repeated.message_id
+
         data = {
             'content': message
         }
@@ -210,27 +358,115 @@ class DiscordIntegration:
                     }
                 ]
             }
-        response = requests.post(self.webhook_url + '?wait=true', json=data)
-        if response.status_code == 200:
-            return response.json().get('id')
-        return response.status_code
+        response = self._schedule(priority, webhook_id, "POST", webhook_url + '?wait=true', json=data)
+        if response is None:
+            message_id = None
+        elif response.status_code == 200:
+            message_id = response.json().get('id')
+        else:
+            message_id = response.status_code
+        if deduplicate:
+            self.deduplicator.sent(message, image_url, webhook_url, message_id if isinstance(message_id, str) else None)
+        return message_id
 
-    def edit_message(self, message_id, new_message):
+    def flush_repeats(self, force=True):
+        """
+        Edits the repeat count into messages whose repeats were suppressed.
+
+        Parameters:
+            - force: Whether to edit every pending count, ignoring the deduplicator's edit_interval.
+
+        Returns:
+            - status_codes: A list of HTTP status codes of the edit requests.
+        """
+        if self.deduplicator is None:
+            return []
+        status_codes = []
+        for entry in self.deduplicator.due_edits(force):
+            status_codes.append(self.edit_message(entry.message_id, entry.text(), priority="bulk", webhook_url=entry.webhook_url))
+        return status_codes
+
+    def _flush_repeats_periodically(self):
+        while not self.flush_stop.wait(self.deduplicator.edit_interval):
+            try:
+                self.flush_repeats(force=False)
+            except Exception as e:
+                print(f"Failed to edit repeat counts: {e}")
+
+    def upsert_message(self, key, message, priority="normal", webhook_url=None):
+        """
+        Sends a message for a key, or edits the message already sent for it.
+        Upserts of the same key run one at a time, so the key never ends up with two messages.
+
+        Parameters:
+            - key: The application key identifying the message, e.g. "deploy-status".
+            - message: The message content.
+            - priority: The scheduler lane to send the message or edit in.
+            - webhook_url: The URL of the webhook to send through instead of the current one.
+
+        Returns:
+            - message_id: The ID of the sent or edited message.
+            - status_code: HTTP status code if sending or editing failed.
+            - None: If the request was shed by the scheduler or no webhook is set.
+        """
+        if webhook_url is None and (self.webhook_url is None or self.webhook_id is None):
+            print("Webhook URL or ID is not set. Use 'use_webhook' or 'create_webhook' first.")
+            return None
+
+        webhook_id = self.webhook_id if webhook_url is None else webhook_url.split('/')[-2]
+        with self.upsert_lock:
+            if self.message_index is None:
+                # Imported here so sending alone never loads sqlite3.
+                if __package__:
+                    from .MessageIndex import MessageIndex
+                else:
+                    from MessageIndex import MessageIndex
+                self.message_index = MessageIndex()
+            # Concurrent upserts of a key would both miss the index and post twice.
+            lock = self.upsert_locks.setdefault((webhook_id, key), threading.Lock())
+
+        with lock:
+            message_id = self.message_index.get(webhook_id, key)
+            if message_id is not None:
+                status_code = self.edit_message(message_id, message, priority, webhook_url)
+                if status_code == 200:
+                    return message_id
+                if status_code != 404:
+                    return status_code
+                # The message was deleted, so post a new one for the key.
+                self.message_index.delete(webhook_id, key)
+
+            # Each key owns its message, so an upsert must not be collapsed into another key's copy.
+            message_id = self.send_message(message, priority=priority, webhook_url=webhook_url, deduplicate=False)
+            if isinstance(message_id, str):
+                self.message_index.set(webhook_id, key, message_id)
+            return message_id
+
+    def edit_message(self, message_id, new_message, priority="normal", webhook_url=None):
         """
         Edits a message sent through the webhook.
 
         Parameters:
             - message_id: The ID of the message to be edited.
             - new_message: The new content of the message.
+            - priority: The scheduler lane to send the edit in.
+            - webhook_url: The URL of the webhook the message was sent through instead of the current one.
 
         Returns:
             - status_code: HTTP status code of the edit request.
         """
-        if self.webhook_url is None or self.webhook_id is None:
+        if webhook_url is None and (self.webhook_url is None or self.webhook_id is None):
             print("Webhook URL or ID is not set. Use 'use_webhook' or 'create_webhook' first.")
             return None
 
-        edit_url = f"{self.webhook_url}/messages/{message_id}"
+        webhook_id = self.webhook_id
+        if webhook_url is not None:
+            url = webhook_url.split('/')
+            webhook_id = url[-2]
+        else:
+            webhook_url = self.webhook_url
+
+        edit_url = f"{webhook_url}/messages/{message_id}"
         data = {
             'content': new_message
         }
@@ -238,15 +474,18 @@ class DiscordIntegration:
             "Authorization": f"Bot {self.token}",
             "Content-Type": "application/json"
         }
-        response = requests.patch(edit_url, json=data, headers=headers)
+        response = self._schedule(priority, webhook_id, "PATCH", edit_url, json=data, headers=headers)
+        if response is None:
+            return None
         return response.status_code
 
-    def delete_message(self, message_id):
+    def delete_message(self, message_id, priority="normal"):
         """
         Deletes a message sent through the webhook.
 
         Parameters:
             - message_id: The ID of the message to be deleted.
+            - priority: The scheduler lane to send the delete in.
 
         Returns:
             - status_code: HTTP status code of the delete request.
@@ -259,7 +498,9 @@ class DiscordIntegration:
         headers = {
             "Authorization": f"Bot {self.token}"
         }
-        response = requests.delete(delete_url, headers=headers)
+        response = self._schedule(priority, self.webhook_id, "DELETE", delete_url, headers=headers)
+        if response is None:
+            return None
         return response.status_code
 
     def get_message(self, message_id):
@@ -279,12 +520,44 @@ class DiscordIntegration:
             "Authorization": f"Bot {self.token}"
         }
 
-        response = requests.get(url, headers=headers)
+        response = self.transport.request("GET", url, headers=headers)
         if response.status_code == 200:
             return response.json()
         else:
             return None
 
+    def get_messages(self, after="0", limit=100, channel_id=None):
+        """
+        Retrieves one page of channel history, oldest first.
+
+        Requests go through the "bulk" scheduler lane and count against the
+        channel's own rate limit, so paging through history does not hold up
+        webhook messages.
+
+        Parameters:
+            - after: Only messages with an ID greater than this are returned.
+            - limit: Maximum number of messages in the page, at most 100.
+            - channel_id: The channel to read instead of the configured one.
+
+        Returns:
+            - messages: A list of message dictionaries sorted by ID.
+            - status_code: HTTP status code if failed.
+            - None: If the request was shed by the scheduler.
+        """
+        channel_id = channel_id or self.channel_id
+        url = f"https://discord.com/api/v9/channels/{channel_id}/messages?after={after}&limit={limit}"
+
+        headers = {
+            "Authorization": f"Bot {self.token}"
+        }
+
+        response = self._schedule("bulk", f"channel-{channel_id}", "GET", url, headers=headers)
+        if response is None:
+            return None
+        if response.status_code == 200:
+            return sorted(response.json(), key=lambda message: int(message["id"]))
+        return response.status_code
+
     def get_pinned_messages(self):
         """
         Retrieves all pinned messages in a channel.
@@ -300,7 +573,7 @@ class DiscordIntegration:
             "Content-Type": "application/json"
         }
 
-        response = requests.get(url, headers=headers)
+        response = self.transport.request("GET", url, headers=headers)
         if response.status_code == 200:
             pinned_messages = []
             for i in response.json():
@@ -325,7 +598,7 @@ class DiscordIntegration:
             "Content-Type": "application/json"
         }
 
-        response = requests.put(url, headers=headers)
+        response = self.transport.request("PUT", url, headers=headers)
         return response.status_code
 
     def unpin_message(self, message_id):
@@ -345,7 +618,7 @@ class DiscordIntegration:
             "Content-Type": "application/json"
         }
 
-        response = requests.delete(url, headers=headers)
+        response = self.transport.request("DELETE", url, headers=headers)
         return response.status_code
 
 
@@ -0,0 +1,169 @@
+import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler
+
+
+MAX_MESSAGE_LENGTH = 2000
+
+LEVEL_PRIORITIES = (
+    (logging.ERROR, "critical"),
+    (logging.WARNING, "normal"),
+    (logging.NOTSET, "bulk")
+)
+
+# Loggers of the HTTP clients the integration sends with. Forwarding their
+# records would send another message for every message sent.
+IGNORED_LOGGERS = ("urllib3", "requests", "httpx", "httpcore", "hpack")
+
+
+class DiscordLogHandler(QueueHandler):
+    def __init__(self, discord_int, routes=None, level=logging.NOTSET, batch_interval=1.0, max_queue=10000, ignore_loggers=IGNORED_LOGGERS):
+        """
+        Initializes the DiscordLogHandler object.
+
+        Records are formatted on the emitting thread and put on a bounded queue
+        without waiting. A listener thread collects them for batch_interval
+        seconds, joins records bound for the same webhook into as few messages
+        as possible and sends them through discord_int. When the queue is full
+        new records are dropped instead of blocking the caller. Records logged
+        while sending, on the listener thread or by the HTTP client's loggers,
+        are ignored so they do not feed back into Discord.
+
+        Parameters:
+            - discord_int: The DiscordIntegration used to send messages.
+            - routes: A dictionary of minimum level to webhook URL. A record goes to
+              the route with the highest level not above its own, and is ignored if
+              no route matches. A webhook URL of None means the current webhook.
+            - level: The handler level.
+            - batch_interval: Seconds to collect records before sending them.
+            - max_queue: Number of queued records before new ones are dropped.
+            - ignore_loggers: Names of loggers whose records, and their children's, are ignored.
+        """
+        super().__init__(queue.Queue(max_queue))
+        self.setLevel(level)
+        self.discord_int = discord_int
+        self.routes = sorted((routes or {logging.NOTSET: None}).items(), key=lambda route: route[0], reverse=True)
+        self.batch_interval = batch_interval
+        self.ignore_loggers = tuple(ignore_loggers)
+        self.dropped = 0
+        self.failed = 0
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """
+        Starts the listener thread.
+
+        Returns:
+            - None
+        """
+        if self.thread is not None:
+            return
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._monitor, name="discord-log-listener", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Sends the queued records and stops the listener thread.
+
+        Returns:
+            - None
+        """
+        if self.thread is None:
+            return
+        self.stopping.set()
+        self.thread.join()
+        self.thread = None
+
+    def close(self):
+        self.stop()
+        super().close()
+
+    def filter(self, record):
+        if self.thread is not None and record.thread == self.thread.ident:
+            return False
+        if any(record.name == name or record.name.startswith(name + ".") for name in self.ignore_loggers):
+            return False
+        return super().filter(record)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _route(self, levelno):
+        for level, webhook_url in self.routes:
+            if levelno >= level:
+                return True, webhook_url
+        return False, None
+
+    def _monitor(self):
+        while not (self.stopping.is_set() and self.queue.empty()):
+            try:
+                batch = [self.queue.get(timeout=self.batch_interval)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.batch_interval
+            while not self.stopping.is_set():
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            while self.stopping.is_set() and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            self._send(batch)
+
+    def _send(self, batch):
+        groups = {}
+        for record in batch:
+            matched, webhook_url = self._route(record.levelno)
+            if not matched:
+                continue
+            priority = next(lane for level, lane in LEVEL_PRIORITIES if record.levelno >= level)
+            groups.setdefault((webhook_url, priority), []).append(record.getMessage())
+
+        for (webhook_url, priority), lines in groups.items():
+            for message in coalesce(lines):
+                try:
+                    result = self.discord_int.send_message(message, priority=priority, webhook_url=webhook_url)
+                except Exception as e:
+                    print(f"Failed to send log records to Discord: {e}")
+                    result = None
+                if not isinstance(result, str):
+                    self.failed += 1
+
+
+def coalesce(lines, max_length=MAX_MESSAGE_LENGTH):
+    """
+    Joins lines into as few messages as possible without exceeding max_length.
+
+    Parameters:
+        - lines: The lines to join.
+        - max_length: The maximum message length.
+
+    Returns:
+        - messages: A list of messages.
+    """
+    messages = []
+    current = ""
+    for line in lines:
+        while len(line) > max_length:
+            if current:
+                messages.append(current)
+                current = ""
+            messages.append(line[:max_length])
+            line = line[max_length:]
+        if current and len(current) + 1 + len(line) > max_length:
+            messages.append(current)
+            current = ""
+        current = f"{current}\n{line}" if current else line
+    if current:
+        messages.append(current)
+    return messages
@@ -0,0 +1,285 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+if __package__:
+    from .RateLimitStore import MemoryRateLimitStore
+else:
+    from RateLimitStore import MemoryRateLimitStore
+
+
+DEFAULT_LANES = {
+    "critical": 8,
+    "normal": 4,
+    "bulk": 1
+}
+
+# Seconds to send without reserving after the rate limit store fails, instead
+# of trying to reach it again for every job.
+STORE_RETRY_INTERVAL = 5
+
+
+class RateLimitBucket:
+    def __init__(self, key="default", store=None):
+        """
+        Tracks the rate-limit budget Discord reports for one webhook.
+
+        The budget is learned from the X-RateLimit-* headers of each response,
+        so until the first response arrives requests are not held back.
+
+        Parameters:
+            - key: The bucket key, usually the webhook id.
+            - store: The store that holds the budget, shared between processes
+              with FileRateLimitStore or RedisRateLimitStore.
+        """
+        self.key = key
+        self.store = store or MemoryRateLimitStore()
+
+    def reserve(self):
+        """
+        Takes one request from the budget if any is left.
+
+        Returns:
+            - 0: If a request was reserved.
+            - delay: Seconds to wait before the budget is refilled.
+        """
+        return self.store.reserve(self.key)
+
+    def update(self, status_code, headers):
+        """
+        Updates the budget from a Discord response.
+
+        Parameters:
+            - status_code: HTTP status code of the response.
+            - headers: The response headers.
+
+        Returns:
+            - None
+        """
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset_after = headers.get("X-RateLimit-Reset-After")
+        if status_code == 429:
+            remaining = 0
+            reset_after = headers.get("Retry-After", reset_after)
+        if remaining is None or reset_after is None:
+            return
+        self.store.update(self.key, int(remaining), float(reset_after))
+
+
+class PriorityScheduler:
+    def __init__(self, lanes=None, max_backlog=None, overflow_policy="drop", sample_every=10, limiter=None):
+        """
+        Initializes the PriorityScheduler object.
+
+        Jobs are queued per lane and dispatched by smooth weighted round robin,
+        so a lane with weight 8 gets eight slots of the rate-limit budget for
+        every slot of a lane with weight 1 while both have work queued.
+
+        Within a lane jobs are queued per bucket. A bucket that is out of
+        budget is parked until it refills, and jobs for other buckets in the
+        lane go ahead, so one throttled webhook does not hold up the others.
+
+        Parameters:
+            - lanes: A dictionary of lane name to weight, highest priority first.
+            - max_backlog: Number of queued jobs after which the lowest lane is shed.
+            - overflow_policy: "drop" to reject lowest lane jobs on overflow,
+              "sample" to keep one in every sample_every of them.
+            - sample_every: Sampling interval used by the "sample" policy.
+            - limiter: A ConcurrencyLimiter bounding the jobs running at once, or None for no bound.
+              Jobs wait in their lane for a slot, so the lane weights still apply.
+        """
+        if overflow_policy not in ("drop", "sample"):
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+
+        self.lanes = dict(lanes or DEFAULT_LANES)
+        self.lowest_lane = list(self.lanes)[-1]
+        self.queues = {lane: OrderedDict() for lane in self.lanes}
+        self.sizes = {lane: 0 for lane in self.lanes}
+        self.parked = {}
+        self.store_down_until = 0
+        self.current_weights = {lane: 0 for lane in self.lanes}
+        self.max_backlog = max_backlog
+        self.overflow_policy = overflow_policy
+        self.sample_every = sample_every
+        self.overflow_count = 0
+        self.dropped = 0
+        self.limiter = limiter
+        self.condition = threading.Condition()
+        self.executor = None
+        self.thread = None
+        self.running = False
+
+    def start(self, executor):
+        """
+        Starts the dispatcher thread.
+
+        Parameters:
+            - executor: The executor that runs dispatched jobs.
+
+        Returns:
+            - None
+        """
+        with self.condition:
+            if self.running:
+                return
+            self.executor = executor
+            self.running = True
+            self.thread = threading.Thread(target=self._dispatch, name="discord-priority-scheduler", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """
+        Stops the dispatcher thread. Jobs still queued are resolved with None.
+
+        Returns:
+            - None
+        """
+        with self.condition:
+            if not self.running:
+                return
+            self.running = False
+            self.condition.notify_all()
+        self.thread.join()
+        for lane, buckets in self.queues.items():
+            for jobs in buckets.values():
+                for job in jobs:
+                    job[0].set_result(None)
+            buckets.clear()
+            self.sizes[lane] = 0
+        self.parked.clear()
+
+    def backlog(self):
+        """
+        Returns the number of queued jobs per lane.
+
+        Returns:
+            - backlog: A dictionary of lane name to queued job count.
+        """
+        with self.condition:
+            return dict(self.sizes)
+
+    def submit(self, lane, bucket, fn, *args, **kwargs):
+        """
+        Queues a job in a lane.
+
+        Parameters:
+            - lane: The lane name, one of the configured lanes.
+            - bucket: The RateLimitBucket the job draws from.
+            - fn: The callable to run.
+
+        Returns:
+            - future: A Future resolved with the job result, or None if shed.
+        """
+        if lane not in self.queues:
+            raise ValueError(f"Unknown lane: {lane}")
+
+        future = Future()
+        with self.condition:
+            if lane == self.lowest_lane and self._overflowing():
+                self.overflow_count += 1
+                if self.overflow_policy == "drop" or self.overflow_count % self.sample_every != 0:
+                    self.dropped += 1
+                    future.set_result(None)
+                    return future
+            self.queues[lane].setdefault(bucket, deque()).append((future, bucket, fn, args, kwargs))
+            self.sizes[lane] += 1
+            self.condition.notify()
+        return future
+
+    def _overflowing(self):
+        if self.max_backlog is None:
+            return False
+        return sum(self.sizes.values()) >= self.max_backlog
+
+    def _ready_lanes(self, now):
+        return [lane for lane in self.lanes
+                if any(self.parked.get(bucket, 0) <= now for bucket in self.queues[lane])]
+
+    def _next_lane(self, ready):
+        return max(ready, key=lambda lane: self.current_weights[lane] + self.lanes[lane])
+
+    def _charge(self, lane, ready):
+        for name in ready:
+            self.current_weights[name] += self.lanes[name]
+        self.current_weights[lane] -= sum(self.lanes[name] for name in ready)
+
+    def _reserve(self, bucket):
+        if time.monotonic() < self.store_down_until:
+            return 0
+        try:
+            return bucket.reserve()
+        except Exception as e:
+            # An unreachable store must not stop the dispatcher. Sending anyway
+            # leaves the throttling to Discord's 429s until the store is back.
+            print(f"Failed to reserve rate limit budget for {bucket.key}: {e}")
+            self.store_down_until = time.monotonic() + STORE_RETRY_INTERVAL
+            return 0
+
+    def _next_job(self):
+        """
+        Takes the next job whose bucket has budget left.
+
+        Returns:
+            - job: The job to dispatch, or None if every queued bucket is parked.
+            - timeout: Seconds until the first parked bucket refills, or None
+              if nothing is queued.
+        """
+        while True:
+            now = time.monotonic()
+            ready = self._ready_lanes(now)
+            if not ready:
+                waits = [self.parked[bucket] - now for buckets in self.queues.values() for bucket in buckets]
+                return None, min(waits) if waits else None
+            # The lane is only charged once a job is dispatched, so a higher
+            # priority job queued while buckets are parked still wins.
+            lane = self._next_lane(ready)
+            buckets = self.queues[lane]
+            for bucket in list(buckets):
+                if self.parked.get(bucket, 0) > now:
+                    continue
+                delay = self._reserve(bucket)
+                if delay > 0:
+                    self.parked[bucket] = now + delay
+                    continue
+                self.parked.pop(bucket, None)
+                self._charge(lane, ready)
+                job = buckets[bucket].popleft()
+                if buckets[bucket]:
+                    # Buckets in a lane take turns.
+                    buckets.move_to_end(bucket)
+                else:
+                    del buckets[bucket]
+                self.sizes[lane] -= 1
+                return job, None
+
+    def _dispatch(self):
+        while True:
+            with self.condition:
+                job = None
+                while self.running and job is None:
+                    if self.limiter is not None and not self.limiter.try_acquire():
+                        # _run notifies once a job finishes and frees a slot.
+                        self.condition.wait()
+                        continue
+                    job, timeout = self._next_job()
+                    if job is None:
+                        if self.limiter is not None:
+                            self.limiter.release()
+                        self.condition.wait(timeout)
+                if job is None:
+                    return
+            self.executor.submit(self._run, *job)
+
+    def _run(self, future, bucket, fn, args, kwargs):
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            result = e
+        if self.limiter is not None:
+            self.limiter.release()
+            with self.condition:
+                self.condition.notify()
+        if isinstance(result, Exception):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
@@ -0,0 +1,197 @@
+import json
+import threading
+import time
+
+
+class RequestsTransport:
+    def __init__(self, pool_size=10):
+        """
+        Sends requests over HTTP/1.1 with a pooled requests.Session, so
+        consecutive requests reuse keep-alive connections.
+
+        Parameters:
+            - pool_size: Maximum number of connections kept per host.
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+        """
+        Sends a request.
+
+        Parameters:
+            - method: The HTTP method.
+            - url: The request URL.
+            - kwargs: headers, data or json, as accepted by requests.
+
+        Returns:
+            - response: The response object with status_code, headers and json().
+        """
+        return self.session.request(method, url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class Http2Transport:
+    def __init__(self, timeout=10, **client_options):
+        """
+        Sends requests over HTTP/2 with httpx, multiplexing all concurrent
+        requests to a host over a single connection.
+
+        Parameters:
+            - timeout: Request timeout in seconds.
+            - client_options: Extra keyword arguments for httpx.Client.
+        """
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError("Http2Transport requires httpx with HTTP/2 support: pip install 'httpx[http2]'")
+
+        self.client = httpx.Client(http2=True, timeout=timeout, **client_options)
+
+    def request(self, method, url, data=None, json=None, headers=None):
+        """
+        Sends a request.
+
+        Parameters:
+            - method: The HTTP method.
+            - url: The request URL.
+            - data: The raw request body.
+            - json: A JSON serializable request body.
+            - headers: The request headers.
+
+        Returns:
+            - response: The response object with status_code, headers and json().
+        """
+        return self.client.request(method, url, content=data, json=json, headers=headers)
+
+    def close(self):
+        self.client.close()
+
+
+class RecordedResponse:
+    def __init__(self, status_code, headers, text):
+        """
+        A response served from a cassette.
+
+        Parameters:
+            - status_code: HTTP status code.
+            - headers: The response headers.
+            - text: The response body.
+        """
+        from requests.structures import CaseInsensitiveDict
+
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class RecordingTransport:
+    def __init__(self, transport, path):
+        """
+        Wraps another transport and writes every request and response, with
+        the time it took, to a cassette file that ReplayTransport serves back.
+
+        The cassette holds response bodies as Discord returned them, which
+        include webhook tokens, so keep it as private as the bot token.
+
+        Parameters:
+            - transport: The transport that sends the requests.
+            - path: The path of the cassette, a JSON lines file that is overwritten.
+        """
+        self.transport = transport
+        self.lock = threading.Lock()
+        self.cassette = open(path, "w")
+
+    def request(self, method, url, **kwargs):
+        """
+        Sends a request through the wrapped transport and records it.
+
+        Parameters:
+            - method: The HTTP method.
+            - url: The request URL.
+            - kwargs: Passed on to the wrapped transport.
+
+        Returns:
+            - response: The response of the wrapped transport.
+        """
+        started = time.perf_counter()
+        response = self.transport.request(method, url, **kwargs)
+        latency = time.perf_counter() - started
+        entry = {
+            "method": method,
+            "url": url,
+            "status": response.status_code,
+            "headers": dict(response.headers),
+            "body": response.text,
+            "latency": latency
+        }
+        with self.lock:
+            self.cassette.write(json.dumps(entry) + "\n")
+            self.cassette.flush()
+        return response
+
+    def close(self):
+        self.transport.close()
+        self.cassette.close()
+
+
+class ReplayTransport:
+    def __init__(self, path, scale=1.0, loop=False):
+        """
+        Serves the responses of a cassette written by RecordingTransport, so
+        DiscordIntegration can be tested offline and repeatably.
+
+        Requests are matched by method and URL. Repeated requests get the
+        recorded responses in the order they were recorded, each after its
+        recorded latency multiplied by scale.
+
+        Parameters:
+            - path: The path of the cassette.
+            - scale: Factor applied to recorded latencies, 0 to answer at once.
+            - loop: Whether to start over once the responses for a request run out.
+        """
+        self.scale = scale
+        self.loop = loop
+        self.lock = threading.Lock()
+        self.interactions = {}
+        self.positions = {}
+        with open(path) as f:
+            for line in f:
+                entry = json.loads(line)
+                self.interactions.setdefault((entry["method"], entry["url"]), []).append(entry)
+
+    def request(self, method, url, **kwargs):
+        """
+        Replays the next recorded response for a request.
+
+        Parameters:
+            - method: The HTTP method.
+            - url: The request URL.
+            - kwargs: Ignored, requests are matched by method and URL only.
+
+        Returns:
+            - response: A RecordedResponse.
+        """
+        key = (method, url)
+        with self.lock:
+            recorded = self.interactions.get(key, [])
+            position = self.positions.get(key, 0)
+            if not recorded or (position >= len(recorded) and not self.loop):
+                raise LookupError(f"No recorded response left for {method} {url}")
+            entry = recorded[position % len(recorded)]
+            self.positions[key] = position + 1
+        time.sleep(entry["latency"] * self.scale)
+        return RecordedResponse(entry["status"], entry["headers"], entry["body"])
+
+    def close(self):
+        pass
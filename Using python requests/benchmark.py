@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+if __package__:
+    from .DiscordIntegration import DiscordIntegration
+    from .Transport import Http2Transport, RecordingTransport, ReplayTransport, RequestsTransport
+else:
+    from DiscordIntegration import DiscordIntegration
+    from Transport import Http2Transport, RecordingTransport, ReplayTransport, RequestsTransport
+
+
+class WebhookServer:
+    def __init__(self, latency):
+        """
+        A local stand-in for the Discord webhook endpoint, served by hypercorn
+        over HTTP/1.1 and cleartext HTTP/2.
+
+        Parameters:
+            - latency: Seconds each request takes, to mimic the round trip to Discord.
+        """
+        self.latency = latency
+        self.connections = set()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+
+        self.connections.add(tuple(scope["client"]))
+        more_body = True
+        while more_body:
+            more_body = (await receive()).get("more_body", False)
+        await asyncio.sleep(self.latency)
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": b'{"id": "1"}'})
+
+
+def bench(name, transport, server, url, messages, concurrency):
+    discord_int = DiscordIntegration({"token": "", "channel_id": ""}, transport=transport)
+    discord_int.use_webhook(url)
+    if server is not None:
+        server.connections.clear()
+    latencies = []
+
+    def send(i):
+        started = time.perf_counter()
+        discord_int.send_message(f"benchmark message {i}")
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as senders:
+        list(senders.map(send, range(messages)))
+    elapsed = time.perf_counter() - started
+    discord_int.close_executor()
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"{name:<10} {messages / elapsed:9.1f} msg/s   p50 {quantiles[49] * 1000:7.1f} ms   "
+          f"p99 {quantiles[98] * 1000:7.1f} ms   connections {len(server.connections) if server else '-'}   "
+          f"concurrency limit {discord_int.limiter.metrics()['limit']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the HTTP/1.1 and HTTP/2 transports against a local server, "
+                                                 "or replay a recorded cassette offline.")
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.02, help="Simulated server latency in seconds.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--record", help="Record the first transport's requests to this cassette.")
+    parser.add_argument("--replay", help="Replay this cassette offline instead of starting a server.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Factor applied to replayed latencies.")
+    args = parser.parse_args()
+
+    url = f"http://127.0.0.1:{args.port}/api/webhooks/1/token"
+    if args.replay:
+        bench("replay", ReplayTransport(args.replay, scale=args.scale, loop=True), None, url, args.messages, args.concurrency)
+        return
+
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = [f"127.0.0.1:{args.port}"]
+    config.loglevel = "WARNING"
+    server = WebhookServer(args.latency)
+    loop = asyncio.new_event_loop()
+    shutdown = asyncio.Event()
+    thread = threading.Thread(target=loop.run_until_complete,
+                              args=(serve(server, config, shutdown_trigger=shutdown.wait),), daemon=True)
+    thread.start()
+    time.sleep(0.5)
+
+    transport = RequestsTransport()
+    if args.record:
+        transport = RecordingTransport(transport, args.record)
+    bench("requests", transport, server, url, args.messages, args.concurrency)
+    # Cleartext HTTP/2 needs prior knowledge, hence http1=False.
+    bench("http2", Http2Transport(http1=False), server, url, args.messages, args.concurrency)
+
+    loop.call_soon_threadsafe(shutdown.set)
+    thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,40 @@
+import gzip
+import json
+import logging
+import os
+import socketserver
+import tempfile
+import threading
+import time
 import unittest
-from DiscordIntegration import DiscordIntegration
+from concurrent.futures import ThreadPoolExecutor
+from ChannelExporter import ChannelExporter
+from ConcurrencyLimiter import ConcurrencyLimiter
+from DiscordIntegration import PENDING, DiscordIntegration
+from MessageDeduplicator import MessageDeduplicator
+from MessageIndex import MessageIndex
+from DiscordLogHandler import DiscordLogHandler, coalesce
+from PriorityScheduler import PriorityScheduler, RateLimitBucket
+from RateLimitStore import FileRateLimitStore, RedisRateLimitStore
+from Transport import RecordingTransport, ReplayTransport, RequestsTransport
 
 
 class TestDiscordIntegration(unittest.TestCase):
 
     def setUp(self):
+        # With DISCORD_CASSETTES set, each test replays its requests from a cassette in that
+        # directory, or records one against Discord when DISCORD_RECORD=1 is set as well.
+        transport = None
+        cassettes = os.environ.get("DISCORD_CASSETTES")
+        if cassettes:
+            path = os.path.join(cassettes, f"{self.id()}.jsonl")
+            if os.environ.get("DISCORD_RECORD") == "1":
+                transport = RecordingTransport(RequestsTransport(), path)
+            else:
+                transport = ReplayTransport(path, scale=0)
+
         # Initialize the DiscordIntegration object for testing
-        self.discord_int = DiscordIntegration({"token": "YOUR BOT TOKEN", "channel_id": "YOUR CHANNEL ID"})
+        self.discord_int = DiscordIntegration({"token": "YOUR BOT TOKEN", "channel_id": "YOUR CHANNEL ID"}, transport=transport)
         webhooks = self.discord_int.get_all_webhooks()
         if webhooks is not None:
             for webhook in webhooks:
@@ -95,5 +123,526 @@ class TestDiscordIntegration(unittest.TestCase):
         self.assertIsNotNone(pinned_messages)
 
 
+class BrokenStore:
+
+    def __init__(self):
+        self.calls = 0
+
+    def reserve(self, key):
+        self.calls += 1
+        raise ConnectionError("store is down")
+
+    def update(self, key, remaining, reset_after):
+        self.calls += 1
+        raise ConnectionError("store is down")
+
+
+class TestPriorityScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.bucket = RateLimitBucket()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_weighted_lanes(self):
+        scheduler = PriorityScheduler()
+        order = []
+        futures = [scheduler.submit("bulk", self.bucket, order.append, "bulk") for _ in range(8)]
+        futures += [scheduler.submit("critical", self.bucket, order.append, "critical") for _ in range(8)]
+        scheduler.start(self.executor)
+        for future in futures:
+            future.result()
+        scheduler.stop()
+        self.assertEqual(order[:9].count("critical"), 8)
+
+    def test_drop_lowest_lane_on_overflow(self):
+        scheduler = PriorityScheduler(max_backlog=1)
+        scheduler.submit("normal", self.bucket, print)
+        future = scheduler.submit("bulk", self.bucket, print)
+        self.assertIsNone(future.result())
+        self.assertEqual(scheduler.dropped, 1)
+        self.assertEqual(scheduler.backlog(), {"critical": 0, "normal": 1, "bulk": 0})
+
+    def test_sample_lowest_lane_on_overflow(self):
+        scheduler = PriorityScheduler(max_backlog=0, overflow_policy="sample", sample_every=2)
+        for _ in range(4):
+            scheduler.submit("bulk", self.bucket, print)
+        self.assertEqual(scheduler.dropped, 2)
+        self.assertEqual(scheduler.backlog()["bulk"], 2)
+
+    def test_rate_limit_bucket(self):
+        self.assertEqual(self.bucket.reserve(), 0)
+        self.bucket.update(200, {"X-RateLimit-Remaining": "1", "X-RateLimit-Reset-After": "60"})
+        self.assertEqual(self.bucket.reserve(), 0)
+        self.assertGreater(self.bucket.reserve(), 0)
+
+    def test_limiter_bounds_running_jobs(self):
+        scheduler = PriorityScheduler(limiter=ConcurrencyLimiter(initial_limit=2, max_limit=2))
+        executor = ThreadPoolExecutor(max_workers=8)
+        running = []
+        peak = []
+
+        def job():
+            running.append(1)
+            peak.append(len(running))
+            time.sleep(0.02)
+            running.pop()
+
+        scheduler.start(executor)
+        futures = [scheduler.submit("normal", self.bucket, job) for _ in range(8)]
+        for future in futures:
+            future.result()
+        scheduler.stop()
+        executor.shutdown()
+        self.assertEqual(max(peak), 2)
+
+    def test_throttled_bucket_does_not_block_others(self):
+        scheduler = PriorityScheduler()
+        throttled = RateLimitBucket("a")
+        throttled.update(429, {"Retry-After": "2"})
+        free = RateLimitBucket("b")
+        scheduler.start(self.executor)
+        waiting = scheduler.submit("normal", throttled, time.monotonic)
+        started = time.monotonic()
+        finished = scheduler.submit("normal", free, time.monotonic).result()
+        self.assertLess(finished - started, 0.5)
+        self.assertFalse(waiting.done())
+        self.assertGreaterEqual(waiting.result() - started, 1.5)
+        scheduler.stop()
+
+    def test_store_failure_does_not_stop_dispatcher(self):
+        store = BrokenStore()
+        scheduler = PriorityScheduler()
+        scheduler.start(self.executor)
+        bucket = RateLimitBucket("a", store)
+        self.assertEqual(scheduler.submit("normal", bucket, sum, [1, 2]).result(timeout=1), 3)
+        self.assertEqual(scheduler.submit("normal", bucket, sum, [3, 4]).result(timeout=1), 7)
+        scheduler.stop()
+        # The second job went out without trying the store again.
+        self.assertEqual(store.calls, 1)
+
+
+class TestConcurrencyLimiter(unittest.TestCase):
+
+    def test_additive_increase(self):
+        limiter = ConcurrencyLimiter(initial_limit=2)
+        self.assertTrue(limiter.try_acquire())
+        limiter.observe(0.1)
+        self.assertEqual(limiter.limit, 2)
+        self.assertTrue(limiter.try_acquire())
+        self.assertFalse(limiter.try_acquire())
+        for _ in range(4):
+            limiter.observe(0.1)
+        # Grows to 3, then stops since only 2 requests are in flight.
+        self.assertEqual(limiter.metrics()["limit"], 3)
+
+    def test_multiplicative_decrease(self):
+        limiter = ConcurrencyLimiter(initial_limit=16)
+        limiter.observe(0.1)
+        limiter.observe(0.1, throttled=True)
+        self.assertEqual(limiter.limit, 8)
+        # Responses to requests sent before the back-off saw the same congestion.
+        limiter.observe(0.5)
+        self.assertEqual(limiter.limit, 8)
+        time.sleep(0.01)
+        limiter.observe(0.001, throttled=True)
+        self.assertEqual(limiter.limit, 4)
+        self.assertEqual(limiter.metrics()["decreases"], 2)
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    # Local stand-in for the handful of Redis commands RedisRateLimitStore uses
+
+    def handle(self):
+        data = self.server.data
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2].decode())
+            command, key = args[0].upper(), args[1]
+            value, expires_at = data.get(key, (None, None))
+            if expires_at is not None and time.time() >= expires_at:
+                value, expires_at = None, None
+                data.pop(key, None)
+            if command == "GET":
+                self.wfile.write(b"$-1\r\n" if value is None else f"${len(value)}\r\n{value}\r\n".encode())
+            elif command == "SET":
+                data[key] = (args[2], time.time() + int(args[4]) / 1000)
+                self.wfile.write(b"+OK\r\n")
+            elif command == "DECR":
+                value = int(value or 0) - 1
+                data[key] = (str(value), expires_at)
+                self.wfile.write(f":{value}\r\n".encode())
+            elif command == "PTTL":
+                ttl = -1 if expires_at is None else int((expires_at - time.time()) * 1000)
+                self.wfile.write(f":{ttl if value is not None else -2}\r\n".encode())
+            elif command == "DEL":
+                self.wfile.write(f":{int(data.pop(key, None) is not None)}\r\n".encode())
+
+
+class TestRateLimitStore(unittest.TestCase):
+
+    def assertSharedBudget(self, first, second):
+        first.update("webhook", 2, 60)
+        self.assertEqual(first.reserve("webhook"), 0)
+        self.assertEqual(second.reserve("webhook"), 0)
+        self.assertGreater(first.reserve("webhook"), 0)
+        self.assertGreater(second.reserve("webhook"), 0)
+        self.assertEqual(second.reserve("other"), 0)
+
+    def test_file_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "ratelimit.json")
+            self.assertSharedBudget(FileRateLimitStore(path), FileRateLimitStore(path))
+
+    def test_redis_store(self):
+        server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), FakeRedisHandler)
+        server.daemon_threads = True
+        server.data = {}
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_address[1]
+        first = RedisRateLimitStore(port=port)
+        second = RedisRateLimitStore(port=port)
+        try:
+            self.assertSharedBudget(first, second)
+        finally:
+            first.close()
+            second.close()
+            server.shutdown()
+            server.server_close()
+
+
+class FakeDiscordIntegration:
+
+    def __init__(self, delay=0, logger=None):
+        self.delay = delay
+        self.logger = logger
+        self.sent = []
+
+    def send_message(self, message, image_url=None, priority="normal", webhook_url=None):
+        time.sleep(self.delay)
+        if self.logger is not None:
+            self.logger.info("sending %s", message)
+        self.sent.append((message, priority, webhook_url))
+        return str(len(self.sent))
+
+
+class TestDiscordLogHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger(f"discord.test.{self.id()}")
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
+
+    def test_routes_and_coalesces_records(self):
+        discord_int = FakeDiscordIntegration()
+        handler = DiscordLogHandler(discord_int, routes={logging.INFO: "https://info", logging.ERROR: "https://errors"},
+                                    batch_interval=0.05)
+        self.logger.addHandler(handler)
+        handler.start()
+        self.logger.debug("ignored")
+        self.logger.info("first")
+        self.logger.info("second")
+        self.logger.error("boom")
+        handler.close()
+        self.logger.removeHandler(handler)
+        self.assertCountEqual(discord_int.sent, [("first\nsecond", "bulk", "https://info"),
+                                                 ("boom", "critical", "https://errors")])
+
+    def test_emit_does_not_block(self):
+        handler = DiscordLogHandler(FakeDiscordIntegration(delay=0.5), batch_interval=0.01)
+        self.logger.addHandler(handler)
+        handler.start()
+        started = time.monotonic()
+        for i in range(100):
+            self.logger.warning("slow discord %d", i)
+        self.assertLess(time.monotonic() - started, 0.25)
+        handler.close()
+        self.logger.removeHandler(handler)
+
+    def test_drops_when_queue_is_full(self):
+        handler = DiscordLogHandler(FakeDiscordIntegration(), max_queue=1)
+        self.logger.addHandler(handler)
+        for _ in range(3):
+            self.logger.info("flood")
+        self.logger.removeHandler(handler)
+        self.assertEqual(handler.dropped, 2)
+
+    def test_ignores_records_logged_while_sending(self):
+        discord_int = FakeDiscordIntegration(logger=self.logger)
+        handler = DiscordLogHandler(discord_int, batch_interval=0.05)
+        http_logger = logging.getLogger("urllib3.connectionpool")
+        self.logger.addHandler(handler)
+        http_logger.addHandler(handler)
+        handler.start()
+        self.logger.info("first")
+        http_logger.warning("Retrying connection")
+        time.sleep(0.2)
+        handler.close()
+        self.logger.removeHandler(handler)
+        http_logger.removeHandler(handler)
+        self.assertEqual(discord_int.sent, [("first", "bulk", None)])
+
+    def test_coalesce(self):
+        self.assertEqual(coalesce(["a", "b"]), ["a\nb"])
+        self.assertEqual(coalesce(["a" * 3, "b" * 3], max_length=5), ["aaa", "bbb"])
+        self.assertEqual(coalesce(["a" * 7], max_length=5), ["aaaaa", "aa"])
+
+
+class TestMessageDeduplicator(unittest.TestCase):
+
+    def test_collapses_repeats(self):
+        deduplicator = MessageDeduplicator()
+        self.assertIsNone(deduplicator.claim("disk full", None, "https://webhook"))
+        deduplicator.sent("disk full", None, "https://webhook", "1")
+        for _ in range(2):
+            self.assertEqual(deduplicator.claim("disk full", None, "https://webhook").message_id, "1")
+        self.assertIsNone(deduplicator.claim("disk full", None, "https://other"))
+        self.assertEqual(deduplicator.due_edits(), [])
+        edits = deduplicator.due_edits(force=True)
+        self.assertEqual([(edit.message_id, edit.text()) for edit in edits], [("1", "disk full\n(repeated 3 times)")])
+        self.assertEqual(deduplicator.due_edits(force=True), [])
+
+    def test_window_expiry_reports_pending_count(self):
+        deduplicator = MessageDeduplicator(window=0)
+        deduplicator.claim("disk full", None, "https://webhook")
+        deduplicator.sent("disk full", None, "https://webhook", "1")
+        deduplicator.entries[next(iter(deduplicator.entries))].count = 2
+        self.assertIsNone(deduplicator.claim("disk full", None, "https://webhook"))
+        self.assertEqual([edit.message_id for edit in deduplicator.due_edits()], ["1"])
+
+    def test_failed_send_is_not_suppressed(self):
+        deduplicator = MessageDeduplicator()
+        deduplicator.claim("disk full", None, "https://webhook")
+        deduplicator.sent("disk full", None, "https://webhook", None)
+        self.assertIsNone(deduplicator.claim("disk full", None, "https://webhook"))
+
+    def test_index_is_bounded(self):
+        deduplicator = MessageDeduplicator(max_entries=2)
+        for i in range(5):
+            deduplicator.claim(f"message {i}", None, "https://webhook")
+        self.assertEqual(len(deduplicator.entries), 2)
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.headers = {}
+        self.body = body
+        self.text = json.dumps(body)
+
+    def json(self):
+        return self.body
+
+
+class FakeTransport:
+
+    def __init__(self, statuses=None):
+        self.statuses = statuses or {}
+        self.requests = []
+        self.closed = False
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url))
+        return FakeResponse(self.statuses.get(method, 200), {"id": "42"})
+
+    def close(self):
+        self.closed = True
+
+
+class TestTransport(unittest.TestCase):
+
+    def test_custom_transport(self):
+        transport = FakeTransport()
+        discord_int = DiscordIntegration({"token": "token", "channel_id": "1"}, transport=transport)
+        discord_int.use_webhook("https://discord.com/api/webhooks/1/token")
+        self.assertEqual(discord_int.send_message("Hello"), "42")
+        self.assertEqual(discord_int.edit_message("42", "Edited"), 200)
+        discord_int.close_executor()
+        self.assertEqual(transport.requests, [("POST", "https://discord.com/api/webhooks/1/token?wait=true"),
+                                              ("PATCH", "https://discord.com/api/webhooks/1/token/messages/42")])
+        self.assertTrue(transport.closed)
+
+    def test_store_failure_after_sending_returns_response(self):
+        transport = FakeTransport()
+        discord_int = DiscordIntegration({"token": "token", "channel_id": "1"}, rate_limit_store=BrokenStore(), transport=transport)
+        discord_int.use_webhook("https://discord.com/api/webhooks/1/token")
+        self.assertEqual(discord_int.send_message("Hello"), "42")
+        discord_int.close_executor()
+        self.assertEqual(len(transport.requests), 1)
+
+    def test_repeats_are_edited_in_the_background(self):
+        transport = FakeTransport()
+        deduplicator = MessageDeduplicator(edit_interval=0.05)
+        discord_int = DiscordIntegration({"token": "token", "channel_id": "1"}, deduplicator=deduplicator, transport=transport)
+        discord_int.use_webhook("https://discord.com/api/webhooks/1/token")
+        self.assertEqual(discord_int.send_message("disk full"), "42")
+        self.assertEqual(discord_int.send_message("disk full"), "42")
+        self.assertEqual([method for method, _ in transport.requests], ["POST"])
+        time.sleep(0.2)
+        discord_int.close_executor()
+        self.assertEqual([method for method, _ in transport.requests], ["POST", "PATCH"])
+
+    def test_warmup(self):
+        transport = FakeTransport()
+        discord_int = DiscordIntegration({"token": "token", "channel_id": "1"}, transport=transport)
+        discord_int.use_webhook("http://localhost/api/webhooks/1/token")
+        self.assertEqual(discord_int.warmup(connections=3), {"id": "42"})
+        self.assertEqual(discord_int.webhook_info, {"id": "42"})
+        self.assertEqual(transport.requests, [("GET", "http://localhost/api/webhooks/1/token")] * 3)
+        discord_int.close_executor()
+
+    def test_upsert_message(self):
+        transport = FakeTransport()
+        discord_int = DiscordIntegration({"token": "token", "channel_id": "1"}, transport=transport)
+        discord_int.use_webhook("https://discord.com/api/webhooks/1/token")
+        self.assertEqual(discord_int.upsert_message("deploy", "Deploying"), "42")
+        self.assertEqual(discord_int.upsert_message("deploy", "Deployed"), "42")
+        transport.statuses["PATCH"] = 404
+        self.assertEqual(discord_int.upsert_message("deploy", "Deployed again"), "42")
+        discord_int.close_executor()
+        self.assertEqual([method for method, _ in transport.requests], ["POST", "PATCH", "PATCH", "POST"])
+
+    def test_concurrent_upserts_post_once(self):
+        transport = FakeTransport()
+        discord_int = DiscordIntegration({"token": "token", "channel_id": "1"}, transport=transport)
+        discord_int.use_webhook("https://discord.com/api/webhooks/1/token")
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            results = list(executor.map(lambda n: discord_int.upsert_message("deploy", f"Step {n}"), range(3)))
+        discord_int.close_executor()
+        self.assertEqual(results, ["42"] * 3)
+        self.assertEqual([method for method, _ in transport.requests], ["POST", "PATCH", "PATCH"])
+
+    def test_repeat_of_message_in_flight(self):
+        transport = FakeTransport()
+        deduplicator = MessageDeduplicator()
+        discord_int = DiscordIntegration({"token": "token", "channel_id": "1"}, deduplicator=deduplicator, transport=transport)
+        discord_int.use_webhook("https://discord.com/api/webhooks/1/token")
+        # As if another caller's POST of the first copy had not returned yet.
+        deduplicator.claim("disk full", None, discord_int.webhook_url)
+        self.assertEqual(discord_int.send_message("disk full"), PENDING)
+        discord_int.close_executor()
+        self.assertEqual(transport.requests, [])
+
+    def test_upsert_is_not_deduplicated(self):
+        transport = FakeTransport()
+        discord_int = DiscordIntegration({"token": "token", "channel_id": "1"}, deduplicator=MessageDeduplicator(), transport=transport)
+        discord_int.use_webhook("https://discord.com/api/webhooks/1/token")
+        discord_int.upsert_message("api", "Healthy")
+        discord_int.upsert_message("worker", "Healthy")
+        discord_int.close_executor()
+        self.assertEqual([method for method, _ in transport.requests], ["POST", "POST"])
+
+    def test_record_and_replay(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cassette.jsonl")
+            transport = RecordingTransport(FakeTransport(statuses={"DELETE": 204}), path)
+            discord_int = DiscordIntegration({"token": "token", "channel_id": "1"}, transport=transport)
+            discord_int.use_webhook("https://discord.com/api/webhooks/1/token")
+            recorded = [discord_int.send_message("Hello"), discord_int.delete_message("42")]
+            discord_int.close_executor()
+
+            transport = ReplayTransport(path, scale=0)
+            discord_int = DiscordIntegration({"token": "token", "channel_id": "1"}, transport=transport)
+            discord_int.use_webhook("https://discord.com/api/webhooks/1/token")
+            self.assertEqual([discord_int.send_message("Hello"), discord_int.delete_message("42")], recorded)
+            with self.assertRaises(LookupError):
+                discord_int.send_message("Hello")
+            discord_int.close_executor()
+
+    def test_replay_scales_latency(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cassette.jsonl")
+            with open(path, "w") as f:
+                f.write(json.dumps({"method": "GET", "url": "https://discord.com/api/v9/webhooks/1", "status": 200,
+                                    "headers": {"X-RateLimit-Remaining": "4"}, "body": "{}", "latency": 0.2}) + "\n")
+            transport = ReplayTransport(path, scale=0.25, loop=True)
+            for _ in range(2):
+                started = time.perf_counter()
+                response = transport.request("GET", "https://discord.com/api/v9/webhooks/1")
+                self.assertAlmostEqual(time.perf_counter() - started, 0.05, delta=0.04)
+            self.assertEqual(response.headers["X-RateLimit-Remaining"], "4")
+
+
+class TestMessageIndex(unittest.TestCase):
+
+    def test_persists_keys(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "messages.db")
+            index = MessageIndex(path)
+            index.set("webhook", "deploy", "1")
+            index.set("webhook", "deploy", "2")
+            index.set("other", "deploy", "3")
+            index.close()
+            index = MessageIndex(path)
+            self.assertEqual(index.get("webhook", "deploy"), "2")
+            self.assertEqual(index.get("other", "deploy"), "3")
+            self.assertEqual(index.count, 2)
+            index.delete("webhook", "deploy")
+            self.assertIsNone(index.get("webhook", "deploy"))
+            index.close()
+
+    def test_evicts_least_recently_updated(self):
+        index = MessageIndex(max_entries=2)
+        for i in range(3):
+            index.set("webhook", f"key {i}", str(i))
+        self.assertIsNone(index.get("webhook", "key 0"))
+        self.assertEqual(index.get("webhook", "key 2"), "2")
+        self.assertEqual(index.count, 2)
+
+
+class FakeChannel:
+
+    def __init__(self, count, fail_after=None, failure=403):
+        self.messages = [{"id": str(1000 + i), "content": f"message {i}"} for i in range(count)]
+        self.fail_after = fail_after
+        self.failure = failure
+        self.requests = 0
+
+    def get_messages(self, after="0", limit=100, channel_id=None):
+        self.requests += 1
+        if self.fail_after is not None and self.requests > self.fail_after:
+            if isinstance(self.failure, Exception):
+                raise self.failure
+            return self.failure
+        return [message for message in self.messages if int(message["id"]) > int(after)][:limit]
+
+
+class TestChannelExporter(unittest.TestCase):
+
+    def test_export_and_resume(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "channel.jsonl.gz")
+            channel = FakeChannel(450, fail_after=2)
+            exporter = ChannelExporter(channel, path, pages_per_checkpoint=1)
+            self.assertEqual(exporter.export(), 200)
+            self.assertEqual(exporter.error, 403)
+            self.assertEqual(ChannelExporter(channel, path).checkpoint()["last_id"], "1199")
+            with open(path, "ab") as f:
+                # An interrupted batch after the checkpoint.
+                f.write(b"partial")
+
+            channel.fail_after = None
+            self.assertEqual(ChannelExporter(channel, path, pages_per_checkpoint=1).export(), 250)
+            with gzip.open(path) as f:
+                ids = [json.loads(line)["id"] for line in f]
+            self.assertEqual(ids, [message["id"] for message in channel.messages])
+
+    def test_fetch_exception_is_raised(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "channel.jsonl.gz")
+            channel = FakeChannel(450, fail_after=1, failure=ConnectionError("connection reset"))
+            with self.assertRaises(ConnectionError):
+                ChannelExporter(channel, path).export()
+            self.assertEqual(ChannelExporter(channel, path).checkpoint()["last_id"], "1099")
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,244 @@
+import argparse
+import importlib
+import os
+import sys
+
+
+# Only the standard library modules above are imported at startup. Each
+# command imports the variant it runs, so a cron job sending one message with
+# the requests transport never loads aiohttp, httpx or the benchmark server.
+VARIANTS = {
+    "requests": "sync",
+    "http2": "sync",
+    "aiohttp": "aio"
+}
+
+
+def load(args, module):
+    """
+    Imports a module of the variant selected with --transport.
+
+    Parameters:
+        - args: The parsed command line arguments.
+        - module: The module name, e.g. "DiscordIntegration".
+
+    Returns:
+        - module: The imported module.
+    """
+    return importlib.import_module(f"{__package__}.{VARIANTS[args.transport]}.{module}")
+
+
+def run(args, action):
+    """
+    Creates a DiscordIntegration for the selected transport, runs an action
+    with it and closes it again.
+
+    Parameters:
+        - args: The parsed command line arguments.
+        - action: A callable taking the DiscordIntegration. With the aiohttp
+          transport it returns an awaitable, which is awaited.
+
+    Returns:
+        - result: The result of the action.
+    """
+    DiscordIntegration = load(args, "DiscordIntegration").DiscordIntegration
+    secrets = {"token": args.token or "", "channel_id": args.channel_id or ""}
+
+    def connect():
+        try:
+            transport = load(args, "Transport").Http2Transport() if args.transport == "http2" else None
+            discord_int = DiscordIntegration(secrets, transport=transport)
+        except ImportError as e:
+            # The package installs without any HTTP client; each transport has an extra.
+            raise SystemExit(f"{e}\nInstall the {args.transport} transport with: "
+                             f"pip install 'discord-webhook-integration[{args.transport}]'")
+        if args.webhook_url:
+            discord_int.use_webhook(args.webhook_url)
+        return discord_int
+
+    if args.transport == "aiohttp":
+        import asyncio
+
+        async def run_async():
+            discord_int = connect()
+            try:
+                return await action(discord_int)
+            finally:
+                await discord_int.close_session()
+
+        return asyncio.run(run_async())
+
+    discord_int = connect()
+    try:
+        return action(discord_int)
+    finally:
+        discord_int.close_executor()
+
+
+def send(args):
+    message = " ".join(args.message)
+    message_id = run(args, lambda discord_int: discord_int.send_message(message, image_url=args.image_url,
+                                                                       priority=args.priority))
+    if not isinstance(message_id, str):
+        print(f"Failed to send message: {message_id}", file=sys.stderr)
+        return 1
+    print(message_id)
+    return 0
+
+
+def read_batches(stream, interval):
+    """
+    Reads lines from a stream in a background thread and groups them into
+    messages, one group per interval seconds.
+
+    Parameters:
+        - stream: The stream to read, usually sys.stdin.
+        - interval: Seconds to collect lines before yielding them.
+
+    Returns:
+        - batches: A generator of lists of messages, each at most 2000 characters.
+    """
+    import queue
+    import threading
+    import time
+    from .sync.DiscordLogHandler import coalesce
+
+    lines = queue.Queue()
+
+    def read():
+        for line in stream:
+            lines.put(line.rstrip("\n"))
+        lines.put(None)
+
+    threading.Thread(target=read, name="discord-webhook-stdin", daemon=True).start()
+    batch = []
+    deadline = None
+    while True:
+        try:
+            line = lines.get(timeout=None if deadline is None else max(0, deadline - time.monotonic()))
+        except queue.Empty:
+            yield coalesce(batch)
+            batch = []
+            deadline = None
+            continue
+        if line is None:
+            break
+        if not line.strip():
+            continue
+        if deadline is None:
+            deadline = time.monotonic() + interval
+        batch.append(line)
+    if batch:
+        yield coalesce(batch)
+
+
+def tail_stdin(args):
+    batches = read_batches(sys.stdin, args.interval)
+
+    def send_batches(discord_int):
+        failed = 0
+        for messages in batches:
+            for message in messages:
+                if not isinstance(discord_int.send_message(message, priority=args.priority), str):
+                    failed += 1
+        return failed
+
+    async def send_batches_async(discord_int):
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        failed = 0
+        while True:
+            # Waiting for stdin in a thread keeps the scheduler running between lines.
+            messages = await loop.run_in_executor(None, next, batches, None)
+            if messages is None:
+                return failed
+            for message in messages:
+                if not isinstance(await discord_int.send_message(message, priority=args.priority), str):
+                    failed += 1
+
+    failed = run(args, send_batches_async if args.transport == "aiohttp" else send_batches)
+    if failed:
+        print(f"Failed to send {failed} messages", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def export(args):
+    ChannelExporter = load(args, "ChannelExporter").ChannelExporter
+    compression = None if args.compression == "none" else args.compression
+    exporter = None
+
+    def export_channel(discord_int):
+        nonlocal exporter
+        exporter = ChannelExporter(discord_int, args.output, compression=compression, parquet_dir=args.parquet_dir)
+        return exporter.export(channel_id=args.channel_id)
+
+    exported = run(args, export_channel)
+    if exporter.error is not None:
+        # The exporter already printed the failed status.
+        print(f"Export stopped after {exported} messages", file=sys.stderr)
+        return 1
+    print(f"Exported {exported} messages to {args.output}")
+    return 0
+
+
+def bench(args):
+    benchmark = load(args, "benchmark")
+    sys.argv = [f"{sys.argv[0]} bench", *args.bench_args]
+    if args.transport == "aiohttp":
+        import asyncio
+        asyncio.run(benchmark.main())
+    else:
+        benchmark.main()
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="discord-webhook", description="Send to and archive Discord channels through webhooks.")
+    parser.add_argument("--transport", choices=list(VARIANTS), default=os.environ.get("DISCORD_TRANSPORT", "requests"),
+                        help="HTTP client to use, requests by default.")
+    parser.add_argument("--webhook-url", default=os.environ.get("DISCORD_WEBHOOK_URL"),
+                        help="Webhook to send through, $DISCORD_WEBHOOK_URL by default.")
+    parser.add_argument("--token", default=os.environ.get("DISCORD_BOT_TOKEN"),
+                        help="Bot token for reading channels, $DISCORD_BOT_TOKEN by default.")
+    parser.add_argument("--channel-id", default=os.environ.get("DISCORD_CHANNEL_ID"),
+                        help="Channel to read, $DISCORD_CHANNEL_ID by default.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("send", help="Send a message.")
+    command.add_argument("message", nargs="+")
+    command.add_argument("--image-url")
+    command.add_argument("--priority", default="normal", choices=["critical", "normal", "bulk"])
+    command.set_defaults(handler=send)
+
+    command = commands.add_parser("tail-stdin", help="Send lines read from stdin, batched into as few messages as possible.")
+    command.add_argument("--interval", type=float, default=1.0, help="Seconds to collect lines before sending them.")
+    command.add_argument("--priority", default="bulk", choices=["critical", "normal", "bulk"])
+    command.set_defaults(handler=tail_stdin)
+
+    command = commands.add_parser("export", help="Export the channel history, resuming from the last export.")
+    command.add_argument("--output", required=True, help="The JSON lines file to write.")
+    command.add_argument("--compression", default="gzip", choices=["gzip", "zstd", "none"])
+    command.add_argument("--parquet-dir", help="Also write Parquet parts to this directory.")
+    command.set_defaults(handler=export)
+
+    command = commands.add_parser("bench", help="Run the transport benchmark, passing on the remaining arguments.")
+    command.add_argument("bench_args", nargs=argparse.REMAINDER)
+    command.set_defaults(handler=bench)
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command in ("send", "tail-stdin") and not args.webhook_url:
+        print("No webhook URL. Pass --webhook-url or set DISCORD_WEBHOOK_URL.", file=sys.stderr)
+        return 2
+    if args.command == "export" and not (args.token and args.channel_id):
+        print("Exporting needs a bot token and channel ID. Pass --token and --channel-id.", file=sys.stderr)
+        return 2
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
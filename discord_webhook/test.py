@@ -0,0 +1,84 @@
+import io
+import os
+import subprocess
+import sys
+import unittest
+from unittest.mock import patch
+from discord_webhook import cli
+
+
+# Seconds importing the CLI may take in a fresh interpreter. A one-shot
+# `discord-webhook send` from cron pays this on every run, on top of the
+# interpreter start and the HTTP client of the chosen transport.
+IMPORT_BUDGET = 0.05
+
+
+def installed():
+    # Run from the repository root, discord_webhook resolves to the directory
+    # here, which has no sync or aio package. Only an editable install maps them in.
+    try:
+        import discord_webhook.sync
+        return True
+    except ImportError:
+        return False
+
+
+NOT_INSTALLED = "needs the variants mapped into discord_webhook, e.g. by pip install -e ."
+
+
+def import_fresh(module):
+    """
+    Imports a module in a fresh interpreter.
+
+    Parameters:
+        - module: The module to import.
+
+    Returns:
+        - elapsed: Seconds the import took.
+        - modules: The names of all modules loaded afterwards.
+    """
+    code = (f"import sys, time; started = time.perf_counter(); import {module}; "
+            "print(time.perf_counter() - started); print(' '.join(sys.modules))")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True).stdout
+    elapsed, modules = output.splitlines()
+    return float(elapsed), modules.split()
+
+
+class TestCli(unittest.TestCase):
+
+    def test_import_budget(self):
+        elapsed, modules = import_fresh("discord_webhook.cli")
+        self.assertLess(elapsed, IMPORT_BUDGET)
+        for module in ("requests", "aiohttp", "httpx", "asyncio", "sqlite3"):
+            self.assertNotIn(module, modules)
+
+    @unittest.skipUnless(installed(), NOT_INSTALLED)
+    def test_send_imports(self):
+        # What `discord-webhook send` loads besides the CLI.
+        _, modules = import_fresh("discord_webhook.sync.DiscordIntegration")
+        for module in ("aiohttp", "httpx", "sqlite3"):
+            self.assertNotIn(module, modules)
+
+    def test_requires_webhook_url(self):
+        environ = {name: value for name, value in os.environ.items()
+                   if name not in ("DISCORD_WEBHOOK_URL", "DISCORD_BOT_TOKEN", "DISCORD_CHANNEL_ID")}
+        with patch.dict(os.environ, environ, clear=True):
+            self.assertEqual(cli.main(["send", "Hello"]), 2)
+            self.assertEqual(cli.main(["export", "--output", "channel.jsonl.gz"]), 2)
+
+    @unittest.skipUnless(installed(), NOT_INSTALLED)
+    def test_missing_client(self):
+        with patch.dict(sys.modules, {"requests": None}):
+            with self.assertRaises(SystemExit) as raised:
+                cli.main(["--webhook-url", "https://discord.com/api/webhooks/1/token", "send", "Hello"])
+        self.assertIn("pip install 'discord-webhook-integration[requests]'", str(raised.exception.code))
+
+    @unittest.skipUnless(installed(), NOT_INSTALLED)
+    def test_read_batches(self):
+        stream = io.StringIO("first\n\nsecond\n" + "x" * 2500 + "\n")
+        self.assertEqual(list(cli.read_batches(stream, interval=10)), [["first\nsecond", "x" * 2000, "x" * 500]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,13 @@
+from setuptools import setup
+from setuptools.command.build_py import build_py
+
+
+class BuildPy(build_py):
+    # Each test.py imports its neighbours flat, the way it is run from its
+    # directory, so it cannot be imported from the installed package.
+    def find_package_modules(self, package, package_dir):
+        modules = super().find_package_modules(package, package_dir)
+        return [(package, module, path) for package, module, path in modules if module != "test"]
+
+
+setup(cmdclass={"build_py": BuildPy})